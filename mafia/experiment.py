@@ -1,23 +1,137 @@
 """Mafia game."""
 
+import bisect
+import functools
+import gevent
 import json
+import logging
 import random
+import time
 
 import dallinger as dlgr
 from dallinger import db
-from dallinger.models import Node, Info, Participant, Network, timenow
+from dallinger.db import redis_conn
+from dallinger.models import Node, Info, Participant, Network, Transmission, timenow
 from dallinger.nodes import Source
 from datetime import datetime
-from flask import Blueprint, Response
+from flask import Blueprint, Response, request
+from flask_login import login_required
+from sqlalchemy import event, text
+from sqlalchemy.orm import object_session
 from faker import Faker
 fake = Faker()
-from collections import defaultdict
-from joblib import load
 
+from . import keys
+from . import metrics
+from . import suspicion
+
+# Imported under the same absolute name as in models.py: a relative import
+# would load a second copy of the module, with its own event buffer, and
+# the phase loop's flush and the game_log route would miss models.py's
+# records.
+import gamelog
+
+
+logger = logging.getLogger(__file__)
 
 DOLLARS_PER_HOUR = 5.0
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
 
+# How long the "The game will begin shortly..." message gets displayed.
+# This ALSO gets set in experiment.js (hardcoded):
+# setTimeout(function () { $("#stimulus").hide(); showExperiment(); }, 2000);
+START_DURATION = 2
+# DAY_ROUND_DURATION = 150
+DAY_ROUND_DURATION = 60
+# NIGHT_ROUND_DURATION = 60
+NIGHT_ROUND_DURATION = 10
+# How long the "this person has been eliminated!" message gets displayed.
+# This ALSO gets set in experiment.js (hardcoded):
+# setTimeout(function () { $("#stimulus").hide(); ... }, 10000);
+BREAK_DURATION = 10
+# How long (seconds) a /transmissions request waits for something to happen,
+# and how often it checks while waiting.
+LONG_POLL_TIMEOUT = 20
+LONG_POLL_INTERVAL = 0.25
+# Counts the seats handed out by get_network_for_participant.
+SEATS_KEY = 'seats'
+# Set once the first participant has a node; see game_started.
+STARTED_KEY = 'started'
+STARTED_TTL = 24 * 60 * 60
+
+# The run (see keys.run_id) this process has seen started, if any.
+_started_run = None
+
+
+# How many rounds to lay out when a game's schedule is built. Games that run
+# longer get their schedule extended as they go.
+SCHEDULED_ROUNDS = 200
+
+
+def round_duration(switches):
+    """Length of the round after `switches` day/night switches."""
+    if switches % 2:
+        return DAY_ROUND_DURATION
+    return NIGHT_ROUND_DURATION
+
+
+def phase_schedule(start, rounds=SCHEDULED_ROUNDS):
+    """Return the times at which each of the first `rounds` rounds of a game
+    started at `start` (seconds since the epoch) end.
+
+    The game opens with a night round; every following round starts with a
+    break before the day or night round itself.
+    """
+    schedule = [start + START_DURATION + NIGHT_ROUND_DURATION]
+    extend_schedule(schedule, rounds)
+    return schedule
+
+
+def extend_schedule(schedule, rounds):
+    """Append round end times to `schedule` until it has `rounds` of them."""
+    while len(schedule) < rounds:
+        schedule.append(schedule[-1] + BREAK_DURATION +
+                        round_duration(len(schedule)))
+
+
+def phase_clock(schedule, now):
+    """Return the number of day/night switches that should have happened by
+    `now` in a game with the given `schedule`, and the seconds left in the
+    current round.
+    """
+    switches = bisect.bisect_right(schedule, now)
+    while switches == len(schedule):
+        extend_schedule(schedule, switches + SCHEDULED_ROUNDS)
+        switches = bisect.bisect_right(schedule, now)
+    left = schedule[switches] - now
+    return switches, int(min(round_duration(switches), left))
+
+
+def network_schedule(net):
+    """The schedule of `net`, or None if no one has joined yet.
+
+    The schedule is cached in redis; if the cached copy is missing, it is
+    rebuilt from the time the network's clock started.
+    """
+    schedule = net.schedule()
+    if schedule is None and net.clock_start is not None:
+        schedule = phase_schedule(net.clock_start)
+        net.cache_schedule(schedule)
+    return schedule
+
+
+def time_left(net):
+    """Seconds left in the current round of `net`."""
+    schedule = network_schedule(net)
+    if schedule is None:
+        return NIGHT_ROUND_DURATION
+    return phase_clock(schedule, time.time())[1]
+
+
+def extra_parameters():
+    config = dlgr.config.get_config()
+    config.register('mafia_games', int, [], False)
+
 
 class MafiaExperiment(dlgr.experiments.Experiment):
     """Define the structure of the experiment."""
@@ -29,16 +143,20 @@ class MafiaExperiment(dlgr.experiments.Experiment):
         self.models = models
         # self.skip_instructions = False  # If True, you'll go directly to /waiting
         self.skip_instructions = True  # If True, you'll go directly to /waiting
-        self.experiment_repeats = 1
+        config = dlgr.config.get_config()
+        # Games played at once; everyone waits in the same room, and
+        # get_network_for_participant deals them out between the games.
+        self.num_games = config.get(u'mafia_games', 1)
+        self.experiment_repeats = self.num_games
         # self.num_participants = 10
-        self.num_participants = 4
+        self.num_participants = 4  # per game
         # self.num_mafia = 2
-        self.num_mafia = 1
+        self.num_mafia = 1  # per game
         # Note: can't do * 2.5 here, won't run even if the end result isn't an integer
         # self.initial_recruitment_size = self.num_participants * 3
         # self.initial_recruitment_size = self.num_participants * 2
-        self.initial_recruitment_size = self.num_participants
-        self.quorum = self.num_participants
+        self.initial_recruitment_size = self.num_participants * self.num_games
+        self.quorum = self.num_participants * self.num_games
         if session:
             self.setup()
         self.known_classes["Text"] = models.Text
@@ -52,6 +170,7 @@ class MafiaExperiment(dlgr.experiments.Experiment):
         function in the super (see experiments.py in dallinger). Then it adds a
         source to each network.
         """
+        self.models.ensure_schema(self.session)
         if not self.networks():
             super(MafiaExperiment, self).setup()
             for net in self.networks():
@@ -63,13 +182,29 @@ class MafiaExperiment(dlgr.experiments.Experiment):
         mafia_network = self.models.MafiaNetwork(
             max_size=self.num_participants + 1
         )  # add a Source
-        mafia_network.daytime = 'False'
+        mafia_network.daytime = False
         mafia_network.winner = None
         mafia_network.last_victim_name = None
         mafia_network.num_victims = 0
         mafia_network.num_rand = 0
+        mafia_network.phase_version = 0
         return mafia_network
 
+    def get_network_for_participant(self, participant):
+        """Seat the participant at one of the games with room left.
+
+        Seats are dealt round-robin from a counter in redis, so participants
+        joining at the same moment on different workers spread out over the
+        games instead of piling into the same one. Everyone plays one game.
+        """
+        if Node.query.filter_by(participant_id=participant.id).count():
+            return None
+        networks = sorted(self.networks(full=False), key=lambda net: net.id)
+        if not networks:
+            return None
+        seat = redis_conn.incr(keys.key(SEATS_KEY))
+        return networks[seat % len(networks)]
+
     def is_overrecruited(self, waiting_count):
         """Returns True if the number of people waiting is in excess of the
         total number expected, indicating that this and subsequent users should
@@ -85,15 +220,29 @@ class MafiaExperiment(dlgr.experiments.Experiment):
             return False
         if waiting_count > self.quorum:
             return True
-        # Check for existing Participant Nodes, which indicates experiment
-        # has started:
-        for network in self.networks():
-            if len(network.nodes(type=Node)) > 1:
-                return True
-        # for network in self.networks():
-        #     if network.nodes(type=Participant):
-        #         return True
-        return False
+        return self.game_started()
+
+    def game_started(self):
+        """True once any participant has a node.
+
+        The answer can only ever change to True within a run, so once it
+        has, this process remembers it for that run. Until then the run's
+        flag in redis is checked, falling back on an EXISTS query in case
+        the flag has expired.
+        """
+        global _started_run
+        run = keys.run_id()
+        if _started_run == run:
+            return True
+        started = bool(redis_conn.exists(keys.key(STARTED_KEY)))
+        if not started:
+            started = self.session.query(
+                Node.query.filter(Node.type != 'source').exists()).scalar()
+            if started:
+                redis_conn.set(keys.key(STARTED_KEY), 1, ex=STARTED_TTL)
+        if started:
+            _started_run = run
+        return started
 
     def record_waiting_room_exit(self, player_id):
         # Nothing calling this currently.
@@ -107,7 +256,7 @@ class MafiaExperiment(dlgr.experiments.Experiment):
                                                  DATETIME_FORMAT)
         except (TypeError, ValueError):
             # just in case something went wrong saving wait room end time
-            last_participant_creation_time = Participant.query.order_by('creation_time')[self.num_participants - 1].creation_time
+            last_participant_creation_time = Participant.query.order_by('creation_time')[self.quorum - 1].creation_time
             end_waiting_room = last_participant_creation_time
         t = 0
         performance_bonus = 0
@@ -123,187 +272,362 @@ class MafiaExperiment(dlgr.experiments.Experiment):
         network.add_node(node)
         source = network.nodes(type=Source)[0]  # find the source in the network
         source.connect(direction="to", whom=node)  # link up the source to the new node
-        last_source_infos = source.infos()
-        if not last_source_infos:
-            source.transmit(to_whom=node)  # in networks.py code, transmit info to the new node
+        if network.announcement_id is None:
+            # The first player gets the opening announcement.
+            announcement = source.create_information()
+            self.session.add(announcement)
+            self.session.flush()
+            network.announcement_id = announcement.id
+            source.transmit(what=announcement, to_whom=node)
         node.receive()  # new node receives everything
+        started_key = keys.key(STARTED_KEY)
+        event.listen(
+            object_session(node), 'after_commit',
+            lambda session: redis_conn.set(started_key, 1, ex=STARTED_TTL),
+            once=True)
 
     def info_post_request(self, node, info):
         """Run when a request to create an info is complete."""
+        if isinstance(info, self.models.Vote):
+            node.network.record_vote(node, info)
+        if isinstance(info, (self.models.Text, self.models.Vote)):
+            suspicion.FeatureStore(node.network).record(node, info)
 
         # Proceed with normal info post request
         for agent in node.neighbors():
             node.transmit(what=info, to_whom=agent)
 
+        # Wake up anyone long-polling once the transmissions are visible.
+        events_key = node.network.events_key
+        event.listen(
+            object_session(node), 'after_commit',
+            lambda session: redis_conn.incr(events_key), once=True)
+
     def create_node(self, participant, network):
         """Create a node for a participant."""
         # Check how many mafia members there are.
         # If there aren't enough, create another:
-        num_mafioso = Node.query.filter_by(type="mafioso").count()
+        network.invalidate_roster()
+        # Every join restarts the clock; the game starts with the last one.
+        # The new schedule is only cached once the join is committed.
+        network.clock_start = time.time()
+        schedule_key = network.schedule_key
+        schedule = json.dumps(phase_schedule(network.clock_start))
+        event.listen(
+            object_session(network), 'after_commit',
+            lambda session: redis_conn.set(
+                schedule_key, schedule, ex=self.models.SCHEDULE_TTL),
+            once=True)
+        num_mafioso = Node.query.filter_by(network_id=network.id,
+                                           type="mafioso").count()
         if num_mafioso < self.num_mafia:
             mafioso = self.models.Mafioso(network=network,
                                           participant=participant)
             mafioso.fake_name = str(fake.name())
-            mafioso.alive = 'True'
+            mafioso.alive = True
             return mafioso
         else:
             bystander = self.models.Bystander(network=network,
                                               participant=participant)
             bystander.fake_name = str(fake.name())
-            bystander.alive = 'True'
+            bystander.alive = True
             return bystander
 
+    @property
+    def background_tasks(self):
+        return [
+            self.phase_loop,
+        ]
+
+    def phase_loop(self):
+        """Switch between day and night and send the clock to clients."""
+        gevent.sleep(1.00)
+        while True:
+            gevent.sleep(1.00)
+            switched = False
+            # Each game advances on its own, so one failing game can't
+            # hold up the others.
+            for net in self.networks():
+                network_id = net.id
+                try:
+                    msg = self.advance_phase(net)
+                    if msg:
+                        switched |= msg['type'] == 'phase_change'
+                        self.publish(msg)
+                except Exception:
+                    logger.exception(
+                        'Error advancing phase of network %s', network_id)
+                    self.session.rollback()
+            # Scoring is optional; it must never hold up the clock.
+            try:
+                if switched or suspicion.scoring_due():
+                    self.score_suspects()
+            except Exception:
+                logger.exception('Error scoring suspects')
+            gamelog.flush()
+            # End the transaction so the next pass sees other workers' rows.
+            self.session.rollback()
+
+    def advance_phase(self, net):
+        """Run the day/night transition for `net` if one is due, and return
+        the message to publish to its clients.
+
+        Every web process runs `phase_loop`, so the transition itself is
+        guarded by the network's phase lock: whoever holds it runs the vote
+        and the kill, the rest just read the cached phase state.
+        """
+        state = net.phase_state()
+        if state['winner']:
+            return None
+        schedule = network_schedule(net)
+        if schedule is None:
+            return None
+        switches, remaining = phase_clock(schedule, time.time())
+        if switches <= state['version']:
+            return {
+                'type': 'tick',
+                'network_id': net.id,
+                'time': remaining,
+                'daytime': state['daytime'],
+            }
+
+        lock = net.phase_lock()
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            state = self.switch_phase(net, state['version'])
+        finally:
+            lock.release()
+        if state is None:
+            return None
+
+        return dict(state, type='phase_change', time=remaining)
+
+    def switch_phase(self, net, version):
+        """Move `net` from phase `version` to the next one, unless another
+        worker already did. Call with the network's phase lock held.
+
+        The version on the network row decides: the lock keeps workers from
+        trying at the same time, and the compare-and-set on the row makes
+        sure a transition never runs twice, even if the lock expired or the
+        cached phase state was lost.
+        """
+        self.session.refresh(net)
+        if not net.claim_phase(version):
+            # Bring the cached state up to date with whoever won.
+            self.session.refresh(net)
+            if net.phase_version > version:
+                net.cache_phase_state(net.stored_phase_state())
+            return None
+        # `net` itself still says `version` until the commit, so the votes
+        # are counted for the phase that is ending.
+        if version % 2:
+            victim_name, winner = net.setup_nighttime()
+            suspicion.FeatureStore(net).record_victim(
+                victim_name, net.vote_tally())
+        else:
+            victim_name, winner = net.setup_daytime()
+        self.announce_phase(net)
+        self.save()
+        gamelog.record(
+            logging.INFO, net.id, 'phase_change', version=version + 1,
+            daytime=net.daytime, victim=victim_name, winner=winner)
+
+        state = net.stored_phase_state()
+        net.cache_phase_state(state)
+        net.bump_events()
+        return state
+
+    def score_suspects(self):
+        """Score the players of every game that is in daytime."""
+        games = []
+        for net in self.networks():
+            state = net.phase_state()
+            if state['daytime'] == 'True' and not state['winner']:
+                games.append((net, net.roster()))
+        if games:
+            suspicion.score(games)
+
+    def announce_phase(self, net):
+        """Send the phase change announcement to every living player. They
+        pick it up with their pending transmissions.
+        """
+        source = net.nodes(type=Source)[0]
+        announcement = source.create_information()
+        self.session.add(announcement)
+        self.session.flush()
+        net.announcement_id = announcement.id
+        net.broadcast(announcement, [p.id for p in net.live_nodes()])
+
+    def publish(self, msg):
+        """Publish a message to the clients of its network. Each game has
+        its own channel, so clients only hear about their own game.
+        """
+        redis_conn.publish(
+            'mafia:{}'.format(msg['network_id']), json.dumps(msg))
+
 
 extra_routes = Blueprint(
     'extra_routes',
     __name__,
     template_folder='templates',
     static_folder='static')
+metrics.instrument(extra_routes)
+
+
+def read_only(route):
+    """Run `route` in a read-only transaction, and roll it back rather than
+    commit it afterwards. The polling routes only read, so they shouldn't
+    cost the database a write transaction each.
+    """
+    @functools.wraps(route)
+    def wrapper(*args, **kwargs):
+        db.session.rollback()
+        db.session.execute(text('SET TRANSACTION READ ONLY'))
+        try:
+            return route(*args, **kwargs)
+        finally:
+            db.session.rollback()
+    return wrapper
+
+
+def network_of(node_id):
+    """The network `node_id` belongs to, in one query."""
+    return Network.query.join(Node, Node.network_id == Network.id).filter(
+        Node.id == node_id).one()
 
 
 @extra_routes.route("/phase/<int:node_id>/<int:switches>/<string:was_daytime>",
                     methods=["GET"])
+@read_only
 def phase(node_id, switches, was_daytime):
+    """Report the current phase. The transitions themselves are run by
+    `MafiaExperiment.phase_loop`; clients only ask here to catch up.
+    """
     try:
-        exp = MafiaExperiment(db.session)
-        this_node = Node.query.filter_by(id=node_id).one()
-        net = Network.query.filter_by(id=this_node.network_id).one()
-        nodes = Node.query.filter_by(network_id=net.id).order_by(
-            'creation_time').all()
-        node = nodes[-1]
-        elapsed_time = timenow() - node.creation_time
-        start_duration = 2 # this line ALSO gets set in experiment.js (hardcoded),
-        # this is how long the "this person has been eliminatedTEMPORARY SWITCH BACK!" message gets displayed
-        # setTimeout(function () { $("#stimulus").hide(); showExperiment(); }, 2000);
-        # day_round_duration = 150
-        day_round_duration = 60
-        # night_round_duration = 60
-        night_round_duration = 10
-        break_duration = 10 # this line ALSO gets set in experiment.js (hardcoded),
-        # this is how long the "The game will begin shortly..." message gets displayed
-        # setTimeout(function () { $("#stimulus").hide(); get_transmissions(currentNodeId); }, 10000);
-        daybreak_duration = day_round_duration + break_duration
-        nightbreak_duration = night_round_duration + break_duration
-        total_time = max(0, elapsed_time.total_seconds() - start_duration)
-        if switches % 2 == 0:
-            time = night_round_duration - (
-                total_time -
-                switches / 2 * daybreak_duration -
-                (switches / 2) * nightbreak_duration
-            ) % night_round_duration
-        else:
-            time = day_round_duration - (
-                total_time -
-                (switches + 1) / 2 * nightbreak_duration -
-                (((switches+1) / 2) -1) * daybreak_duration
-            ) % day_round_duration
-        time = int(time)
-        victim_name = None
-        victim_type = None
-        winner = None
-
-        daytime = (net.daytime == 'True')
-        phase_map = {'True': 'Phase Change to Daytime', 'False': 'Phase Change to Nighttime'}
-
-        if was_daytime != net.daytime:
-            victim_name = net.last_victim_name
-            db.logger.exception('Victim Name (as copied from network)')
-            db.logger.exception(victim_name)
-            winner = net.winner
-            db.logger.exception('Winner')
-            db.logger.exception(winner)
-            net.node_random()
-            source = net.nodes(type=Source)[0]
-            last_source_info = Info.query.filter_by(
-                origin_id=source.id,
-                type='info'
-            ).order_by('creation_time')[-1]
-            if last_source_info.contents.split(':')[0] != phase_map[net.daytime]:
-                if this_node.property2 == 'True':
-                    source.transmit(to_whom=this_node)
-        # If it's night but should be day, then call setup_daytime()
-        elif not daytime and (
-            int(total_time -
-                switches / 2 * daybreak_duration
-                - (switches / 2) * nightbreak_duration
-                ) >= night_round_duration):
-            victim_name, winner = net.setup_daytime()
-            db.logger.exception('Winner')
-            db.logger.exception(winner)
-            source = net.nodes(type=Source)[0]
-            last_source_info = Info.query.filter_by(
-                origin_id=source.id,
-                type='info'
-            ).order_by('creation_time')[-1]
-            if last_source_info.contents.split(':')[0] != phase_map[net.daytime]:
-                if this_node.property2 == 'True':
-                    source.transmit(to_whom=this_node)
-        # If it's day but should be night, then call setup_nighttime()
-        elif daytime and (
-            int(total_time -
-                (switches + 1) / 2 * nightbreak_duration
-                - (((switches + 1) / 2) - 1) * daybreak_duration
-                ) >= day_round_duration):
-            victim_name, winner = net.setup_nighttime()
-            db.logger.exception('Winner')
-            db.logger.exception(winner)
-            source = net.nodes(type=Source)[0]
-            last_source_info = Info.query.filter_by(
-                origin_id=source.id,
-                type='info'
-            ).order_by('creation_time')[-1]
-            if last_source_info.contents.split(':')[0] != phase_map[net.daytime]:
-                if this_node.property2 == 'True':
-                    source.transmit(to_whom=this_node)
-
-
-        exp.save()
-
-        if victim_name:
-            victim_type = Node.query.filter_by(property1=victim_name).one().type
-            db.logger.exception('Victim Type')
-            db.logger.exception(victim_type)
-        else:
-            victim_type = None
-            net.last_victim_name = None
+        net = network_of(node_id)
+        snapshot = dict(net.phase_state(), time=time_left(net))
+
+        return Response(
+            response=json.dumps(snapshot),
+            status=200,
+            mimetype='application/json')
+    except Exception:
+        db.logger.exception('Error fetching phase')
+        return Response(
+            status=403,
+            mimetype='application/json')
+
+
+@extra_routes.route("/transmissions/<int:node_id>/<int:version>",
+                    methods=["GET"])
+def transmissions(node_id, version):
+    """Wait for new messages to `node_id` or for the phase to move on from
+    `version`, then return both: the pending transmissions with their infos
+    inlined, and the current phase.
+
+    Only marking transmissions received writes to the database, and that
+    commits on its own.
+    """
+    try:
+        net = network_of(node_id)
+        # Keep using the network for redis lookups without touching the DB.
+        db.session.expunge(net)
+        deadline = time.time() + LONG_POLL_TIMEOUT
+        events = None
+        while True:
+            latest_events = net.events()
+            if latest_events != events:
+                events = latest_events
+                received = receive_transmissions(node_id)
+                state = net.phase_state()
+                if received or state['version'] != version:
+                    break
+            # Give the connection back to the pool while we wait.
+            db.session.rollback()
+            if time.time() >= deadline:
+                break
+            gevent.sleep(LONG_POLL_INTERVAL)
+        db.session.rollback()
 
         return Response(
             response=json.dumps({
-                'time': time, 'daytime': net.daytime,
-                'victim_name': victim_name, 'victim_type': victim_type, 'winner': winner
+                'transmissions': received,
+                'phase': dict(state, time=time_left(net)),
             }),
             status=200,
             mimetype='application/json')
     except Exception:
-        db.logger.exception('Error fetching phase')
+        db.logger.exception('Error fetching transmissions')
         return Response(
             status=403,
             mimetype='application/json')
 
 
+def receive_transmissions(node_id):
+    """Mark the pending transmissions to `node_id` as received, and return
+    them along with their infos' contents and types.
+    """
+    rows = db.session.query(Transmission, Info).join(
+        Info, Transmission.info_id == Info.id
+    ).filter(
+        Transmission.destination_id == node_id,
+        Transmission.status == 'pending',
+        Transmission.failed.is_(False),
+    ).order_by(Transmission.creation_time).all()
+    received = [{
+        'id': t.id,
+        'info_id': info.id,
+        'contents': info.contents,
+        'type': info.type,
+    } for t, info in rows]
+    if received:
+        Transmission.query.filter(
+            Transmission.id.in_([t['id'] for t in received])
+        ).update({
+            'status': 'received',
+            'receive_time': timenow(),
+        }, synchronize_session=False)
+        db.session.commit()
+    return received
+
+
+@extra_routes.route("/game_log/<int:network_id>", methods=["GET"])
+@login_required
+def game_log(network_id):
+    """The recorded events of a game, optionally filtered with the `event`
+    and `since` query parameters.
+
+    The log gives away who the mafia are, so only those logged in to the
+    dashboard get to see it.
+    """
+    since = request.args.get('since', type=float)
+    events = gamelog.query(network_id, request.args.get('event'), since)
+
+    return Response(
+        response=json.dumps({'events': events}),
+        status=200,
+        mimetype='application/json')
+
+
 @extra_routes.route("/live_participants/<int:node_id>/<int:get_all>",
                     methods=["GET"])
+@read_only
 def live_participants(node_id, get_all):
     try:
-        exp = MafiaExperiment(db.session)
-        this_node = Node.query.filter_by(id=node_id).one()
+        net = network_of(node_id)
         if get_all == 1:
-            nodes = Node.query.filter_by(network_id=this_node.network_id,
-                                         property2='True').all()
+            players = net.live_nodes()
         else:
-            nodes = Node.query.filter_by(network_id=this_node.network_id,
-                                         property2='True',
-                                         type='mafioso').all()
+            players = net.live_mafiosi()
         participants = []
-        for node in nodes:
-            if node.property1 == this_node.property1:
-                participants.append(node.property1 + ' (you!)')
+        for player in players:
+            if player.id == node_id:
+                participants.append(player.fake_name + ' (you!)')
             else:
-                participants.append(node.property1)
+                participants.append(player.fake_name)
         random.shuffle(participants)
 
-        exp.save()
-
         return Response(
             response=json.dumps({'participants': participants}),
             status=200,
@@ -317,101 +641,11 @@ def live_participants(node_id, get_all):
 
 @extra_routes.route("/suspected_mafia/<int:node_id>/<int:get_all>",
                     methods=["GET"])
+@read_only
 def suspected_mafia(node_id, get_all):
     try:
-        exp = MafiaExperiment(db.session)
-        this_node = Node.query.filter_by(id=node_id).one()
-        infos = Info.query.filter_by().order_by('creation_time')
-        daytime_infos = defaultdict(lambda: defaultdict(list))
-        night = False
-        victims = []
-        num_rounds = 0
-        round_start_time = 0
-        for info in infos:
-            if 'Phase Change to Nighttime' in info.contents:
-                night = True
-                if 'Victim' in info.contents:
-                    victims.append(info.contents.split('- ')[1])
-                else:
-                    victims.append(None)
-                continue
-            elif 'Phase Change to Daytime' in info.contents:
-                if night:
-                    night = False
-                    num_rounds += 1
-                    round_start_time = info.creation_time
-                continue
-            if not night:
-                if info.type == 'vote':
-                    voter, votee = info.contents.split(': ')
-                    daytime_infos[voter][num_rounds].append((votee, (info.creation_time - round_start_time).total_seconds()))
-                else:
-                    texter, text = info.contents.split(': ')
-                    daytime_infos[texter][num_rounds].append((len(text), (info.creation_time - round_start_time).total_seconds()))
-        nodes = Node.query.filter_by(network_id=this_node.network_id,
-                                     property2='True').all()
-        participants = [node.property1 for node in nodes]
-        [daytime_infos[participant][round] for participant in participants for round in range(1, num_rounds)]
-        features = defaultdict(list)
-        for participant in daytime_infos:
-            prop_round_votes = 0.
-            prop_round_majority_votes = 0.
-            prop_round_texts_before_votes = 0.
-            prop_round_texts = 0.
-            mean_time_votes = 0.
-            mean_time_texts = 0.
-            mean_num_texts = 0.
-            mean_len_texts = 0.
-            for round in daytime_infos[participant]:
-                found_text = False
-                for i, act in enumerate(daytime_infos[participant][round]):
-                    if type(act[0]) == int:
-                        if i == 0:
-                            prop_round_texts_before_votes += 1
-                        if not found_text:
-                            prop_round_texts += 1
-                            found_text = True
-                        mean_num_texts += 1
-                        mean_len_texts += act[0]
-                        mean_time_texts += act[1]
-                    elif type(act[0]) == str:
-                        prop_round_votes += 1
-                        if act[0] == victims[round]:
-                            prop_round_majority_votes += 1
-                        mean_time_votes += act[1]
-            features[participant].append(prop_round_votes / (num_rounds - 1))
-            # if prop_round_votes:
-            #     features[participant].append(prop_round_majority_votes / prop_round_votes)
-            # else:
-            #     features[participant].append(None)
-            features[participant].append(prop_round_majority_votes / (num_rounds - 1))
-            # if prop_round_votes:
-            #     features[participant].append(prop_round_texts_before_votes / prop_round_votes)
-            # else:
-            #     features[participant].append(None)
-            features[participant].append(prop_round_texts_before_votes / (num_rounds - 1))
-            features[participant].append(prop_round_texts / (num_rounds - 1))
-            # if prop_round_votes:
-            #     features[participant].append(mean_time_votes / prop_round_votes)
-            # else:
-            #     features[participant].append(None)
-            features[participant].append(mean_time_votes / (num_rounds - 1))
-            # if prop_round_texts:
-            #     features[participant].append(mean_time_texts / prop_round_texts)
-            # else:
-            #     features[participant].append(None)
-            features[participant].append(mean_time_texts / (num_rounds - 1))
-            features[participant].append(mean_num_texts / (num_rounds - 1))
-            if mean_num_texts:
-                features[participant].append(mean_len_texts / mean_num_texts)
-            else:
-                features[participant].append(0.)
-        participants = list(features.values())
-
-        model = load('mafia_model.joblib')
-        probs = model.predict_proba(list(features.values()))
-        participants = [[list(features.keys())[i], mafia_prob] for i, (mafia_prob, _) in enumerate(probs)]
-        exp.save()
+        net = network_of(node_id)
+        participants = suspicion.latest_scores(net)
 
         return Response(
             response=json.dumps({'participants': participants}),
@@ -436,7 +670,7 @@ class Source(Source):
         """
 
         net = Network.query.filter_by(id=self.network_id).one()
-        if net.property1 == 'True':
+        if net.daytime:
             if net.last_victim_name:
                 return "Phase Change to Daytime: Victim - " + net.last_victim_name
             else:
@@ -0,0 +1,85 @@
+"""A structured log of what happens in each game.
+
+Events are only built when the `mafia.games` logger is enabled for their
+level, so with debug logging off the debug events cost one level check.
+Recorded events are buffered and written out in batches, both as JSON
+lines to the logger and to a per-network list in redis that `query`
+reads back.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from dallinger.db import redis_conn
+
+import keys
+
+
+logger = logging.getLogger('mafia.games')
+
+# Write the buffer out once it holds this many events; `flush` is also
+# called after every pass of the phase loop.
+BATCH_SIZE = 50
+# How many events to keep for each network, and for how long (seconds).
+MAX_EVENTS = 10000
+EVENTS_TTL = 24 * 60 * 60
+
+_buffer = []
+_lock = threading.Lock()
+
+
+def record(level, network_id, event, **fields):
+    """Record `event` in network `network_id` if `level` is enabled.
+
+    Fields may be given as callables, which are only called when the event
+    is recorded.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    for name, value in fields.items():
+        if callable(value):
+            fields[name] = value()
+    entry = dict(fields, network_id=network_id, event=event,
+                 level=logging.getLevelName(level), time=time.time())
+    with _lock:
+        _buffer.append((level, entry))
+        full = len(_buffer) >= BATCH_SIZE
+    if full:
+        flush()
+
+
+def flush():
+    """Write out the buffered events."""
+    global _buffer
+    with _lock:
+        batch, _buffer = _buffer, []
+    if not batch:
+        return
+    lines = [json.dumps(entry, default=str) for _, entry in batch]
+    logger.log(min(level for level, _ in batch), '\n'.join(lines))
+
+    pipe = redis_conn.pipeline()
+    for (_, entry), line in zip(batch, lines):
+        pipe.rpush(_log_key(entry['network_id']), line)
+    for network_id in set(entry['network_id'] for _, entry in batch):
+        pipe.ltrim(_log_key(network_id), -MAX_EVENTS, -1)
+        pipe.expire(_log_key(network_id), EVENTS_TTL)
+    pipe.execute()
+
+
+def query(network_id, event=None, since=None):
+    """Return the recorded events of network `network_id`, oldest first,
+    optionally only those called `event` or recorded after `since` (seconds
+    since the epoch).
+    """
+    entries = [json.loads(line)
+               for line in redis_conn.lrange(_log_key(network_id), 0, -1)]
+    return [e for e in entries
+            if (event is None or e['event'] == event) and
+            (since is None or e['time'] > since)]
+
+
+def _log_key(network_id):
+    return keys.key(network_id, 'log')
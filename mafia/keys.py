@@ -0,0 +1,21 @@
+"""Names of the redis keys the mafia experiment keeps its state under.
+
+A fresh database hands out the same network ids again, so every key is
+prefixed with the id of the experiment run: the app id Dallinger gives
+each deployment and debug session. A new run against the same redis never
+sees an earlier run's games, seats or flags.
+"""
+
+from dallinger.config import get_config
+
+
+def key(*parts):
+    """The redis key for `parts` in this experiment run, for example
+    `key(network.id, 'phase')`.
+    """
+    return ':'.join(['mafia', run_id()] + [str(part) for part in parts])
+
+
+def run_id():
+    """The app id of this experiment run."""
+    return get_config().get('id', u'local')
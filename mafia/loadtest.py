@@ -0,0 +1,223 @@
+"""Load test for the mafia routes.
+
+Plays simulated games through the experiment's Flask app (with the Flask
+test client, so no web server or recruiter is involved) against the local
+Postgres and redis configured for the experiment. Each bot polls, chats and
+votes the way the browser client does, and at the end the latency
+percentiles and SQL statement counts of every route are printed.
+
+The database is reset first. Run it from this directory:
+
+    python loadtest.py --games 10 --duration 300
+"""
+
+import argparse
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import event
+
+CHAT_LINES = [
+    "I think it's {}.",
+    "{} has been very quiet...",
+    "Why would {} vote like that?",
+    "It's not me, I promise.",
+    "Let's all vote for {}.",
+    "Who do you all suspect?",
+]
+
+
+class Recorder(object):
+    """Collects the latency and number of SQL statements of each request,
+    by route.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.local = threading.local()
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.local.queries = getattr(self.local, 'queries', 0) + 1
+
+    def timed(self, route, request):
+        """Run `request` and record it under `route`."""
+        self.local.queries = 0
+        start = time.time()
+        response = request()
+        elapsed = time.time() - start
+        with self.lock:
+            self.latencies[route].append(elapsed)
+            self.queries[route].append(self.local.queries)
+        return response
+
+    def report(self):
+        print('{:<22}{:>9}{:>10}{:>10}{:>10}{:>10}'.format(
+            'route', 'requests', 'p50 ms', 'p95 ms', 'p99 ms', 'queries'))
+        for route in sorted(self.latencies):
+            ms = np.asarray(self.latencies[route]) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            print('{:<22}{:>9}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}'.format(
+                route, len(ms), p50, p95, p99,
+                np.mean(self.queries[route])))
+
+
+class Bot(object):
+    """One simulated player.
+
+    A poller thread long-polls /transmissions like the browser does; the
+    player itself wakes up every second to chat and vote, and refreshes
+    the participant lists and suspicion scores whenever the phase changes.
+    """
+
+    def __init__(self, app, recorder, participant_id, deadline, rng,
+                 chat_interval):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.participant_id = participant_id
+        self.deadline = deadline
+        self.rng = rng
+        self.chat_interval = chat_interval
+        self.phase = {'version': 0, 'daytime': 'False', 'winner': None}
+        self.voted = -1
+
+    def request(self, route, method, path, **kwargs):
+        response = self.recorder.timed(
+            route, lambda: self.client.open(path, method=method, **kwargs))
+        if response.status_code != 200:
+            return None
+        return response.get_json()
+
+    def run(self):
+        node = self.request(
+            'node', 'POST', '/node/{}'.format(self.participant_id))['node']
+        self.node_id = node['id']
+        self.name = node['property1']
+        self.is_mafioso = node['type'] == 'mafioso'
+        self.refresh()
+        poller = threading.Thread(target=self.poll)
+        poller.daemon = True
+        poller.start()
+
+        seen = self.phase['version']
+        while self.playing():
+            time.sleep(1)
+            if self.phase['version'] != seen:
+                seen = self.phase['version']
+                self.request('phase', 'GET', '/phase/{}/{}/{}'.format(
+                    self.node_id, seen, self.phase['daytime']))
+                self.refresh()
+            self.act()
+
+    def playing(self):
+        return time.time() < self.deadline and not self.phase['winner']
+
+    def poll(self):
+        while self.playing():
+            resp = self.request(
+                'transmissions', 'GET', '/transmissions/{}/{}'.format(
+                    self.node_id, self.phase['version']))
+            if resp is None:
+                time.sleep(1)
+            else:
+                self.phase = resp['phase']
+
+    def refresh(self):
+        players = self.request('live_participants', 'GET',
+                               '/live_participants/{}/1'.format(self.node_id))
+        self.others = [p for p in (players or {}).get('participants', [])
+                       if not p.endswith('(you!)')]
+        self.mafia = []
+        if self.is_mafioso:
+            mafia = self.request('live_participants', 'GET',
+                                 '/live_participants/{}/0'.format(
+                                     self.node_id))
+            self.mafia = (mafia or {}).get('participants', [])
+        self.request('suspected_mafia', 'GET',
+                     '/suspected_mafia/{}/1'.format(self.node_id))
+
+    def act(self):
+        daytime = self.phase['daytime'] == 'True'
+        targets = [p for p in self.others if p not in self.mafia]
+        if not targets or not (daytime or self.is_mafioso):
+            return
+        if self.rng.random() < 1. / self.chat_interval:
+            line = self.rng.choice(CHAT_LINES).format(
+                self.rng.choice(targets))
+            self.post('Text', line)
+        if self.voted != self.phase['version'] and self.rng.random() < .1:
+            self.voted = self.phase['version']
+            self.post('Vote', self.rng.choice(targets))
+
+    def post(self, info_type, text):
+        self.request('info ({})'.format(info_type), 'POST',
+                     '/info/{}'.format(self.node_id),
+                     data={'contents': '{}: {}'.format(self.name, text),
+                           'info_type': info_type})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--duration', type=float, default=300,
+                        help='seconds to play for')
+    parser.add_argument('--chat-interval', type=float, default=10,
+                        help='average seconds between a bot\'s messages')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from dallinger.config import get_config
+    config = get_config()
+    config.load()
+    # A run id of its own keeps the games' redis keys apart from any
+    # earlier run's.
+    config.extend({'mode': u'debug', 'recruiter': u'hotair',
+                   'mafia_games': args.games,
+                   'id': u'loadtest-{}'.format(uuid.uuid4())})
+
+    from dallinger import db
+    db.init_db(drop_all=True)
+    from dallinger.experiment_server.experiment_server import app
+    from dallinger_experiment.experiment import MafiaExperiment
+
+    exp = MafiaExperiment(db.session)
+    db.session.commit()
+    phase_loop = threading.Thread(target=exp.phase_loop)
+    phase_loop.daemon = True
+    phase_loop.start()
+
+    recorder = Recorder()
+    recorder.install(db.engine)
+    client = app.test_client()
+    participant_ids = []
+    for i in range(exp.quorum):
+        resp = recorder.timed('participant', lambda: client.post(
+            '/participant/bot{0}/hit/bot{0}/debug'.format(i)))
+        participant_ids.append(resp.get_json()['participant']['id'])
+
+    deadline = time.time() + args.duration
+    rng = random.Random(args.seed)
+    threads = []
+    for participant_id in participant_ids:
+        bot = Bot(app, recorder, participant_id, deadline,
+                  random.Random(rng.random()), args.chat_interval)
+        thread = threading.Thread(target=bot.run)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    recorder.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Per-route timing of requests and of the SQL they run.
+
+Every request adds its wall time, number of SQL statements and time spent
+in SQL to per-minute totals in redis, so the numbers cover all workers and
+dynos. /metrics sums the last WINDOW minutes into a latency histogram and
+averages for each route.
+"""
+
+import bisect
+import json
+import logging
+import time
+from collections import defaultdict
+
+from dallinger import db
+from dallinger.db import redis_conn
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__file__)
+
+# Upper bounds (milliseconds) of the latency histogram's buckets; the last
+# bucket holds everything slower.
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+# Totals are kept per SLOT seconds, and /metrics covers the last WINDOW slots.
+SLOT = 60
+WINDOW = 15
+
+
+def instrument(blueprint, engine=None):
+    """Time every request the app serves, and serve the totals from
+    /metrics on `blueprint`.
+    """
+    engine = engine or db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_sql):
+        event.listen(engine, 'before_cursor_execute', _before_sql)
+        event.listen(engine, 'after_cursor_execute', _after_sql)
+    blueprint.before_app_request(_start_request)
+    blueprint.after_app_request(_finish_request)
+    blueprint.add_url_rule('/metrics', 'metrics', metrics)
+
+
+def _start_request():
+    g.metrics = {'start': time.time(), 'sql_count': 0, 'sql_time': 0.}
+
+
+def _before_sql(*args):
+    if has_request_context() and 'metrics' in g:
+        g.metrics['sql_start'] = time.time()
+
+
+def _after_sql(*args):
+    if has_request_context() and 'sql_start' in g.get('metrics', {}):
+        g.metrics['sql_count'] += 1
+        g.metrics['sql_time'] += time.time() - g.metrics.pop('sql_start')
+
+
+def _finish_request(response):
+    timing = g.pop('metrics', None)
+    if timing is not None and request.url_rule is not None:
+        route = '{} {}'.format(request.method, request.url_rule.rule)
+        try:
+            record(route, time.time() - timing['start'],
+                   timing['sql_count'], timing['sql_time'])
+        except Exception:
+            logger.exception('Error recording metrics for {}'.format(route))
+    return response
+
+
+def record(route, wall_time, sql_count, sql_time):
+    """Add one request to `route`'s totals for the current slot."""
+    key = _slot_key(int(time.time() // SLOT))
+    bucket = bisect.bisect_left(BUCKETS, wall_time * 1000)
+    pipe = redis_conn.pipeline()
+    pipe.hincrby(key, '{}|count'.format(route), 1)
+    pipe.hincrby(key, '{}|bucket:{}'.format(route, bucket), 1)
+    pipe.hincrbyfloat(key, '{}|wall_time'.format(route), wall_time)
+    pipe.hincrby(key, '{}|sql_count'.format(route), sql_count)
+    pipe.hincrbyfloat(key, '{}|sql_time'.format(route), sql_time)
+    pipe.expire(key, SLOT * (WINDOW + 1))
+    pipe.execute()
+
+
+def summarize(totals):
+    """Turn summed '<route>|<field>' totals into per-route statistics.
+
+    Percentiles are the upper bound of the histogram bucket they fall in,
+    or None when that is the open-ended last bucket.
+    """
+    routes = defaultdict(dict)
+    for field, value in totals.items():
+        route, name = field.rsplit('|', 1)
+        routes[route][name] = value
+
+    summary = {}
+    for route, fields in routes.items():
+        count = fields.get('count', 0)
+        if not count:
+            continue
+        histogram = [int(fields.get('bucket:{}'.format(i), 0))
+                     for i in range(len(BUCKETS) + 1)]
+        summary[route] = {
+            'count': int(count),
+            'histogram': dict(zip([str(b) for b in BUCKETS] + ['inf'],
+                                  histogram)),
+            'mean_ms': 1000 * fields.get('wall_time', 0.) / count,
+            'p50_ms': _percentile(histogram, count, .50),
+            'p95_ms': _percentile(histogram, count, .95),
+            'p99_ms': _percentile(histogram, count, .99),
+            'sql_count': fields.get('sql_count', 0.) / count,
+            'sql_ms': 1000 * fields.get('sql_time', 0.) / count,
+        }
+    return summary
+
+
+def _percentile(histogram, count, q):
+    seen = 0
+    for bound, n in zip(BUCKETS, histogram):
+        seen += n
+        if seen >= q * count:
+            return bound
+    return None
+
+
+def metrics():
+    """Report each route's statistics over the last WINDOW slots."""
+    now = int(time.time() // SLOT)
+    pipe = redis_conn.pipeline()
+    for slot in range(now - WINDOW + 1, now + 1):
+        pipe.hgetall(_slot_key(slot))
+    totals = defaultdict(float)
+    for slot_totals in pipe.execute():
+        for field, value in slot_totals.items():
+            totals[field.decode('utf-8')] += float(value)
+
+    return Response(
+        response=json.dumps(summarize(totals)),
+        status=200,
+        mimetype='application/json')
+
+
+def _slot_key(slot):
+    return 'metrics:{}'.format(slot)
@@ -1,17 +1,124 @@
 """Define kinds of nodes: agents, sources, and environments."""
+import json
 import logging
+from collections import namedtuple
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, Index, Integer, String)
+# `Text` is the Info subclass below.
+from sqlalchemy import Text as TextType
+from sqlalchemy import and_, event, or_, text
 from sqlalchemy.ext.hybrid import hybrid_property
-from dallinger.models import Node, Network, Info, timenow
+from sqlalchemy.orm import Session, object_session
+from dallinger.models import Node, Network, Info, Transformation, Transmission, Vector, timenow
 from dallinger.nodes import Source
-from random import seed, random
+import numpy as np
 from dallinger import db
+from dallinger.db import redis_conn
 from datetime import datetime
 
+import gamelog
+import keys
+
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
-seed(42)
+# Keep a phase's votes around for a day after the last one was cast.
+VOTE_TALLY_TTL = 24 * 60 * 60
+# Seeds each network's random number generator, along with its id.
+RNG_SEED = 42
+# Cached rosters expire after an hour, and roster generations after a day
+# without changes.
+ROSTER_TTL = 60 * 60
+ROSTER_GENERATION_TTL = 24 * 60 * 60
+# Cached schedules expire after a day; they are rebuilt from the network's
+# clock_start when needed again.
+SCHEDULE_TTL = 24 * 60 * 60
+# Session.info key of the networks whose roster the current transaction
+# has changed.
+CHANGED_ROSTERS = 'mafia_changed_rosters'
 
 logger = logging.getLogger(__name__)
 
+_schema_ready = False
+
+# A cached, read-only view of a Bystander or Mafioso.
+Player = namedtuple(
+    'Player', ['id', 'fake_name', 'type', 'alive', 'failed', 'deathtime'])
+
+
+def ensure_schema(session):
+    """Add the mafia columns and indexes to an existing database, and copy
+    over the values older games kept in the text `propertyN` columns.
+
+    Fresh databases get all of this from `create_all`. The catalog is
+    checked first, once per process, so the ALTER TABLEs and their locks are
+    only ever taken on a database that actually needs them.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    if not schema_current(session):
+        for statement in MIGRATION:
+            session.execute(text(statement))
+        session.commit()
+    _schema_ready = True
+
+
+def schema_current(session):
+    """True if the database already has every mafia column and index."""
+    columns = set((table, column) for table, column in session.execute(text(
+        "SELECT table_name, column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() "
+        "AND column_name LIKE 'mafia%'")))
+    indexes = set(name for name, in session.execute(text(
+        "SELECT indexname FROM pg_indexes "
+        "WHERE schemaname = current_schema()")))
+    expected = set(
+        (table.name, column.name)
+        for table in (Node.__table__, Network.__table__)
+        for column in table.columns if column.name.startswith('mafia')
+    )
+    return expected <= columns and set(SCHEMA_INDEXES) <= indexes
+
+
+MIGRATION = [
+    "ALTER TABLE node ADD COLUMN IF NOT EXISTS mafia_alive BOOLEAN",
+    "ALTER TABLE node ADD COLUMN IF NOT EXISTS mafia_deathtime TIMESTAMP",
+    "ALTER TABLE network ADD COLUMN IF NOT EXISTS mafia_daytime BOOLEAN",
+    "ALTER TABLE network ADD COLUMN IF NOT EXISTS mafia_winner VARCHAR(50)",
+    "ALTER TABLE network "
+    "ADD COLUMN IF NOT EXISTS mafia_last_victim_name VARCHAR(255)",
+    "ALTER TABLE network ADD COLUMN IF NOT EXISTS mafia_num_victims INTEGER",
+    "ALTER TABLE network ADD COLUMN IF NOT EXISTS mafia_num_rand INTEGER",
+    "ALTER TABLE network ADD COLUMN IF NOT EXISTS mafia_rng_state TEXT",
+    "ALTER TABLE network "
+    "ADD COLUMN IF NOT EXISTS mafia_announcement_id INTEGER",
+    "ALTER TABLE network "
+    "ADD COLUMN IF NOT EXISTS mafia_phase_version INTEGER DEFAULT 0",
+    "ALTER TABLE network "
+    "ADD COLUMN IF NOT EXISTS mafia_clock_start DOUBLE PRECISION",
+    "CREATE INDEX IF NOT EXISTS ix_node_mafia_roster "
+    "ON node (network_id, mafia_alive, type)",
+    "CREATE INDEX IF NOT EXISTS ix_info_origin_type_created "
+    "ON info (origin_id, type, creation_time)",
+    "UPDATE node SET mafia_alive = (property2 = 'True'), "
+    "mafia_deathtime = CAST(property3 AS TIMESTAMP) "
+    "WHERE type IN ('bystander', 'mafioso') AND mafia_alive IS NULL",
+    "UPDATE network SET mafia_daytime = (property1 = 'True'), "
+    "mafia_winner = property2, mafia_last_victim_name = property3, "
+    "mafia_num_victims = CAST(property4 AS INTEGER), "
+    "mafia_num_rand = CAST(property5 AS INTEGER) "
+    "WHERE type = 'mafia-network' AND mafia_daytime IS NULL",
+]
+SCHEMA_INDEXES = ['ix_node_mafia_roster', 'ix_info_origin_type_created']
+
+
+def fail_where(model, *criteria):
+    """Fail every row of `model` matching `criteria` with a single UPDATE,
+    setting the same fields as `fail()` does.
+    """
+    return model.query.filter(model.failed.is_(False), *criteria).update(
+        {'failed': True, 'time_of_death': timenow()},
+        synchronize_session=False)
+
 
 class Text(Info):
     """A text"""
@@ -48,49 +155,29 @@ class Bystander(Node):
         """Make name queryable."""
         return self.property1
 
-    @hybrid_property
-    def alive(self):
-        """Convert property2 to alive."""
-        try:
-            return self.property2
-        except TypeError:
-            return None
-
-    @alive.setter
-    def alive(self, is_alive):
-        """Make alive settable."""
-        self.property2 = is_alive
-
-    @alive.expression
-    def alive(self):
-        """Make alive queryable."""
-        return self.property2
-
-    @hybrid_property
-    def deathtime(self):
-        """Convert property3 to death time."""
-        try:
-            return self.property3
-        except TypeError:
-            return None
-
-    @deathtime.setter
-    def deathtime(self, death_time):
-        """Make death time settable."""
-        self.property3 = death_time
-
-    @deathtime.expression
-    def deathtime(self):
-        """Make death time queryable."""
-        return self.property3
+    # Single table inheritance: these columns live on the node table.
+    alive = Column('mafia_alive', Boolean)
+    deathtime = Column('mafia_deathtime', DateTime)
 
     def fail(self):
         super().fail()
-        if self.network.infos():
+        self.network.invalidate_roster()
+        if self.network.announcement_id is not None:
             self.network.max_size -= 1
             self.network.calculate_full()
 
 
+# Roster lookups filter on these, see MafiaNetwork.roster().
+Index('ix_node_mafia_roster',
+      Node.__table__.c.network_id, Node.__table__.c.mafia_alive,
+      Node.__table__.c.type)
+
+# Lookups of a node's infos of one type in creation order use this.
+Index('ix_info_origin_type_created',
+      Info.__table__.c.origin_id, Info.__table__.c.type,
+      Info.__table__.c.creation_time)
+
+
 class Mafioso(Bystander):
     """Member of the mafia."""
 
@@ -106,273 +193,361 @@ class MafiaNetwork(Network):
     def add_node(self, node):
         """Add a node, connecting it to other mafia if mafioso."""
         if node.type == "mafioso":
-            other_mafiosi = [n for n in self.live_mafiosi() if n.id != node.id]
-            for n in other_mafiosi:
-                try:
-                    node.connect(direction="both", whom=n)
-                except ValueError:
-                    logger.error("Error connecting Mafioso!", exc_info=1)
+            # Newly created nodes might not be flushed to the database yet.
+            object_session(node).flush()
+            other_mafiosi = [n.id for n in self.live_mafiosi() if n.id != node.id]
+            self.add_vectors(
+                [(node.id, n) for n in other_mafiosi] +
+                [(n, node.id) for n in other_mafiosi])
 
     def add_source(self, source):
         """Connect the source to all existing other nodes."""
         nodes = [n for n in self.nodes() if not isinstance(n, Source)]
         source.connect(whom=nodes)
 
-    @hybrid_property
-    def daytime(self):
-        """Convert property1 to daytime."""
-        try:
-            return self.property1
-        except TypeError:
-            return None
-
-    @daytime.setter
-    def daytime(self, is_daytime):
-        """Make time settable."""
-        self.property1 = is_daytime
-
-    @daytime.expression
-    def daytime(self):
-        """Make time queryable."""
-        return self.property1
-
-    @hybrid_property
-    def winner(self):
-        """Convert property2 to winner."""
-        try:
-            return self.property2
-        except TypeError:
+    # Single table inheritance: these columns live on the network table.
+    daytime = Column('mafia_daytime', Boolean, default=False)
+    winner = Column('mafia_winner', String(50))
+    last_victim_name = Column('mafia_last_victim_name', String(255))
+    num_victims = Column('mafia_num_victims', Integer, default=0)
+    # How many players tied for the most votes in the last vote.
+    num_rand = Column('mafia_num_rand', Integer, default=0)
+    # The network's own random number generator, see rng().
+    rng_state = Column('mafia_rng_state', TextType)
+    # The source's latest phase announcement, see announcement(). Set as
+    # soon as the first player joins.
+    announcement_id = Column('mafia_announcement_id', Integer)
+    # How many phase transitions have run, see phase_state().
+    phase_version = Column('mafia_phase_version', Integer, default=0)
+    # When the game clock started (seconds since the epoch), that is when
+    # the last player joined. The schedule is built from it, see schedule().
+    clock_start = Column('mafia_clock_start', Float)
+
+    def announcement(self):
+        """Return the Info announcing the current phase, if any."""
+        if self.announcement_id is None:
             return None
+        return Info.query.get(self.announcement_id)
 
-    @winner.setter
-    def winner(self, is_winner):
-        """Make time settable."""
-        self.property2 = is_winner
+    @property
+    def phase_key(self):
+        return keys.key(self.id, 'phase')
 
-    @winner.expression
-    def winner(self):
-        """Make winner queryable."""
-        return self.property2
+    def phase_state(self):
+        """Return the result of the last phase transition.
 
-    @hybrid_property
-    def last_victim_name(self):
-        """Convert property3 to last_victim_name."""
-        try:
-            return self.property3
-        except TypeError:
-            return None
-
-    @last_victim_name.setter
-    def last_victim_name(self, is_last_victim_name):
-        """Make last_victim_name settable."""
-        self.property3 = is_last_victim_name
-
-    @last_victim_name.expression
-    def last_victim_name(self):
-        """Make last_victim_name queryable."""
-        return self.property3
-
-    @hybrid_property
-    def num_victims(self):
-        """Convert property4 to num_victims."""
-        try:
-            return int(self.property4)
-        except TypeError:
+        The phase state is versioned: version 0 is the opening night, and
+        every transition bumps the version by one, so odd versions are days.
+        It is cached in redis; if the cached copy is missing, it is read off
+        the network row instead.
+        """
+        state = redis_conn.get(self.phase_key)
+        if state is None:
+            return self.stored_phase_state()
+        return json.loads(state)
+
+    def stored_phase_state(self):
+        """The phase state as recorded on the network row."""
+        victim_name = self.last_victim_name
+        victim_type = None
+        if victim_name:
+            victim_type = self.player(victim_name).type
+        started_at = None
+        announcement = self.announcement()
+        if announcement is not None:
+            started_at = announcement.creation_time.strftime(DATETIME_FORMAT)
+        return {
+            'network_id': self.id,
+            'version': self.phase_version or 0,
+            'daytime': 'True' if self.daytime else 'False',
+            'victim_name': victim_name,
+            'victim_type': victim_type,
+            'winner': self.winner,
+            'started_at': started_at,
+        }
+
+    def cache_phase_state(self, state):
+        redis_conn.set(self.phase_key, json.dumps(state))
+
+    def claim_phase(self, version):
+        """Move the phase version on from `version` with a compare-and-set
+        UPDATE, and return whether it was still at `version`. Only one
+        transaction can win; the row stays locked until it ends.
+        """
+        claimed = MafiaNetwork.query.filter(
+            MafiaNetwork.id == self.id,
+            MafiaNetwork.phase_version == version,
+        ).update({'phase_version': version + 1}, synchronize_session=False)
+        return bool(claimed)
+
+    @property
+    def events_key(self):
+        return keys.key(self.id, 'events')
+
+    def events(self):
+        """Count of messages and phase changes, for long-polling clients."""
+        return int(redis_conn.get(self.events_key) or 0)
+
+    def bump_events(self):
+        redis_conn.incr(self.events_key)
+
+    @property
+    def schedule_key(self):
+        return keys.key(self.id, 'schedule')
+
+    def schedule(self):
+        """Return the cached times (seconds since the epoch) at which each
+        round of the game ends, or None if it isn't cached. The experiment
+        rebuilds it from `clock_start` then.
+        """
+        schedule = redis_conn.get(self.schedule_key)
+        if schedule is None:
             return None
+        return json.loads(schedule)
 
-    @num_victims.setter
-    def num_victims(self, is_num_victims):
-        """Make num_victims settable."""
-        self.property4 = is_num_victims
+    def cache_schedule(self, schedule):
+        redis_conn.set(
+            self.schedule_key, json.dumps(schedule), ex=SCHEDULE_TTL)
 
-    @num_victims.expression
-    def num_victims(self):
-        """Make num_victims queryable."""
-        return self.property4
+    def phase_lock(self):
+        """Lock held by whichever worker runs this network's transitions."""
+        return redis_conn.lock(self.phase_key + ':lock', timeout=30)
 
-    @hybrid_property
-    def num_rand(self):
-        """Convert property5 to num_rand."""
-        try:
-            return int(self.property5)
-        except TypeError:
-            return None
+    def fail_bystander_vectors(self):
+        """Fails Vectors connecting Bystanders (non-Mafia), and their
+        transmissions, in one UPDATE each.
+        """
+        mafiosi = [n.id for n in self.live_mafiosi()]
+        sources = [n.id for n in self.nodes(type=Source)]
+        bystander_vectors = db.session.query(Vector.id).filter(
+            Vector.network_id == self.id,
+            Vector.failed.is_(False),
+            ~Vector.origin_id.in_(sources),
+            ~and_(Vector.origin_id.in_(mafiosi),
+                  Vector.destination_id.in_(mafiosi)),
+        )
+        fail_where(Transmission, Transmission.vector_id.in_(bystander_vectors))
+        fail_where(Vector, Vector.id.in_(bystander_vectors))
+
+    def rng(self):
+        """Return the network's random number generator.
+
+        Each network seeds its own from RNG_SEED and its id, and stores the
+        generator's state after every use with `save_rng`. Draws are then
+        reproducible whichever worker makes them.
+        """
+        rng = np.random.default_rng([RNG_SEED, self.id])
+        if self.rng_state:
+            rng.bit_generator.state = json.loads(self.rng_state)
+        return rng
 
-    @num_rand.setter
-    def num_rand(self, num_random):
-        """Make num_rand settable."""
-        self.property5 = num_random
+    def save_rng(self, rng):
+        self.rng_state = json.dumps(rng.bit_generator.state)
 
-    @num_rand.expression
-    def num_rand(self):
-        """Make num_rand queryable."""
-        return self.property5
+    def votes_key(self, version):
+        return '{}:votes:{}'.format(self.phase_key, version)
 
-    def fail_bystander_vectors(self):
-        """Fails Vectors connecting Bystanders (non-Mafia).
+    def record_vote(self, node, vote):
+        """Count `node`'s vote towards the current phase. Only a player's
+        latest vote in a phase counts.
         """
-        mafiosi = self.live_mafiosi()
-        for v in self.vectors():  # returns non-failed Vectors only
-            if not isinstance(v.origin, Source) and not (
-                    v.origin in mafiosi and v.destination in mafiosi):
-                v.fail()
-
-    def node_random(self):
-        for _ in range(self.num_rand):
-            random()
+        key = self.votes_key(self.phase_state()['version'])
+        votee = vote.contents.split(': ')[1]
+        redis_conn.hset(key, node.id, votee)
+        redis_conn.expire(key, VOTE_TALLY_TTL)
+
+    def vote_tally(self):
+        """Map node ids to the name they voted for in the current phase."""
+        key = self.votes_key(self.phase_state()['version'])
+        return {
+            int(node_id): votee.decode('utf-8')
+            for node_id, votee in redis_conn.hgetall(key).items()
+        }
 
     def vote(self, nodes):
-        phase_map = {'True': 'Phase Change to Daytime', 'False': 'Phase Change to Nighttime'}
         votes = {}
-        infos = Info.query.filter_by(
-                            origin_id=self.nodes(type=Source)[0].id,
-                            type='info'
-                            ).order_by('creation_time')
-        phase_start_time = infos[-1].creation_time
-        i = 0
-        while infos[-1 - i].contents.split(': ')[0] == phase_map[self.daytime]:
-            i += 1
-            phase_start_time = infos[-1 - i].creation_time
-        db.logger.exception('Phase Start Time')
-        db.logger.exception(phase_start_time)
+        tally = self.vote_tally()
         for node in nodes:
-            vote = None
-            node_votes = Info.query.filter_by(
-                origin_id=node.id,
-                type='vote'
-            ).order_by('creation_time')
-            if node_votes.first() and (node_votes[-1].creation_time - phase_start_time).total_seconds() > 0:
-                node_vote = node_votes[-1].contents.split(': ')[1]
-                vote = node_vote
-            db.logger.exception('Node')
-            db.logger.exception(node)
-            db.logger.exception('Node Vote')
-            db.logger.exception(vote)
+            vote = tally.get(node.id)
             if vote:
                 if vote in votes:
                     votes[vote] += 1
                 else:
                     votes[vote] = 1
-        db.logger.exception('Votes')
-        db.logger.exception(votes)
-        sorted_kv = sorted(votes.items(), key=lambda kv: kv[0])
+        gamelog.record(logging.DEBUG, self.id, 'votes', votes=votes)
         if votes:
-            victim_name, num_votes = max(sorted_kv, key=lambda kv: kv[1] + random())
+            num_votes = max(votes.values())
+            tied = sorted(name for name, n in votes.items() if n == num_votes)
+            rng = self.rng()
+            victim_name = tied[rng.integers(len(tied))]
+            self.save_rng(rng)
             self.last_victim_name = victim_name
-            num_random = len([v for _, v in votes.items() if v == num_votes])
-            self.num_rand = num_random
-            victim_node = Node.query.filter_by(property1=victim_name).one()
-            db.logger.exception('Victim Node')
-            db.logger.exception(victim_node)
+            self.num_rand = len(tied)
+            victim_node = Node.query.get(self.player(victim_name).id)
             self.kill_victim(victim_node)
         else:
             self.num_rand = 0
             victim_name = None
             self.last_victim_name = None
-            db.logger.exception('Victim Node')
-            db.logger.exception(self.last_victim_name)
-            db.logger.exception('Victim Death Time')
-            db.logger.exception(None)
-            db.logger.exception('Victim Count')
-            db.logger.exception(self.num_victims)
+            gamelog.record(logging.INFO, self.id, 'no_victim',
+                           daytime=self.daytime)
         return victim_name
 
     def kill_victim(self, victim_node):
         """Don't fail the Node itself, but fail all it's related objects.
         TODO: explain why not just victim_node.fail()
         """
-        victim_node.alive = 'False'
+        victim_node.alive = False
         victim_node.deathtime = timenow()
-        db.logger.exception('Victim Death Time')
-        db.logger.exception(victim_node.deathtime)
+        self.invalidate_roster()
         self.num_victims += 1
-        db.logger.exception('Victim Count')
-        db.logger.exception(self.num_victims)
-        for v in victim_node.vectors():
-            v.fail()
-        for i in victim_node.infos():
-            i.fail()
-        for t in victim_node.transmissions(direction="all"):
-            t.fail()
-        for t in victim_node.transformations():
-            t.fail()
+        gamelog.record(logging.INFO, self.id, 'victim',
+                       node_id=victim_node.id, name=victim_node.fake_name,
+                       type=victim_node.type, daytime=self.daytime,
+                       tied=self.num_rand, deathtime=victim_node.deathtime,
+                       num_victims=self.num_victims)
+        # One UPDATE per table, covering what the victim's vectors, infos,
+        # transmissions and transformations would fail one by one.
+        victim_id = victim_node.id
+        victim_infos = db.session.query(Info.id).filter(
+            Info.origin_id == victim_id)
+        fail_where(Transformation, or_(
+            Transformation.node_id == victim_id,
+            Transformation.info_in_id.in_(victim_infos),
+            Transformation.info_out_id.in_(victim_infos),
+        ))
+        fail_where(Transmission, or_(
+            Transmission.origin_id == victim_id,
+            Transmission.destination_id == victim_id,
+            Transmission.info_id.in_(victim_infos),
+        ))
+        fail_where(Vector, or_(
+            Vector.origin_id == victim_id,
+            Vector.destination_id == victim_id,
+        ))
+        fail_where(Info, Info.origin_id == victim_id)
 
     def setup_daytime(self):
-        self.daytime = 'True'
-        victim_nodes = self.victim_nodes()
-        db.logger.exception('Daytime - Past Victim Nodes')
-        db.logger.exception(victim_nodes)
-        db.logger.exception('Daytime - Victim Count')
-        db.logger.exception(self.num_victims)
-        if len(victim_nodes) > self.num_victims:
-            self.node_random()
-            self.last_victim_name = victim_nodes[-1].fake_name
-            db.logger.exception('Daytime - Victim')
-            db.logger.exception(self.last_victim_name)
-            return self.last_victim_name, self.get_winner()
+        self.daytime = True
         mafiosi = self.live_mafiosi()
         victim_name = self.vote(mafiosi)
-        db.logger.exception('Daytime Victim')
-        db.logger.exception(victim_name)
         self.connect_all_nodes()
         return victim_name, self.get_winner()
 
     def setup_nighttime(self):
-        self.daytime = 'False'
-        victim_nodes = self.victim_nodes()
-        db.logger.exception('Nighttime - Past Victim Nodes')
-        db.logger.exception(victim_nodes)
-        db.logger.exception('Nighttime - Victim Count')
-        db.logger.exception(self.num_victims)
-        if len(victim_nodes) > self.num_victims:
-            self.node_random()
-            self.last_victim_name = victim_nodes[-1].fake_name
-            db.logger.exception('Nighttime - Victim')
-            db.logger.exception(self.last_victim_name)
-            return self.last_victim_name, self.get_winner()
+        self.daytime = False
         nodes = self.live_nodes()
         victim_name = self.vote(nodes)
-        db.logger.exception('Nighttime Victim')
-        db.logger.exception(victim_name)
         self.fail_bystander_vectors()
         return victim_name, self.get_winner()
 
     def connect_all_nodes(self):
-        nodes = self.live_nodes()
-        for n in nodes:
-            for m in nodes:
-                if n != m:
-                    n.connect(whom=m, direction="to")
-
-    def victim_nodes(self):
-        """Victim bystanders and mafiosi"""
-        nodes = Node.query.filter_by(
-            network_id=self.id,
-            property2='False'
-        ).order_by('property3').all()
-        return nodes
+        """Connect every living node to every other one, inserting only the
+        missing vectors in one go.
+        """
+        ids = [n.id for n in self.live_nodes()]
+        self.add_vectors([(o, d) for o in ids for d in ids if o != d])
+
+    def add_vectors(self, pairs):
+        """Create a vector for each (origin_id, destination_id) pair that
+        isn't already connected, with a single bulk INSERT.
+        """
+        existing = set(db.session.query(
+            Vector.origin_id, Vector.destination_id
+        ).filter_by(network_id=self.id, failed=False))
+        rows = [
+            {'origin_id': o, 'destination_id': d, 'network_id': self.id}
+            for o, d in pairs if (o, d) not in existing
+        ]
+        if rows:
+            db.session.bulk_insert_mappings(Vector, rows)
+
+    def broadcast(self, info, node_ids):
+        """Send `info` from its origin to each of `node_ids` along the
+        existing vectors, with a single bulk INSERT of Transmissions.
+        """
+        vectors = db.session.query(Vector.id, Vector.destination_id).filter(
+            Vector.origin_id == info.origin_id,
+            Vector.destination_id.in_(node_ids),
+            Vector.failed.is_(False))
+        rows = [
+            {'vector_id': vector_id, 'info_id': info.id,
+             'origin_id': info.origin_id, 'destination_id': destination_id,
+             'network_id': self.id, 'status': 'pending'}
+            for vector_id, destination_id in vectors
+        ]
+        if rows:
+            db.session.bulk_insert_mappings(Transmission, rows)
+
+    @property
+    def roster_generation_key(self):
+        return keys.key(self.id, 'roster', 'generation')
+
+    def roster(self):
+        """Every Bystander and Mafioso in the network, as Players.
+
+        The roster only changes when someone joins or is killed, so it is
+        cached in redis under a generation number that moves on whenever a
+        transaction that changed it ends (see `invalidate_roster`). Copies
+        filled from older data are left behind under the old generation.
+        """
+        session = object_session(self) or db.session
+        if self.id in session.info.get(CHANGED_ROSTERS, ()):
+            # Our own changes aren't committed, so they mustn't be cached.
+            return self.query_roster()
+        generation = int(redis_conn.get(self.roster_generation_key) or 0)
+        key = keys.key(self.id, 'roster', generation)
+        cached = redis_conn.get(key)
+        if cached is not None:
+            return [Player(*p) for p in json.loads(cached)]
+        roster = self.query_roster()
+        redis_conn.set(key, json.dumps(roster), ex=ROSTER_TTL)
+        return roster
+
+    def query_roster(self):
+        """The roster, read from the database."""
+        rows = db.session.query(
+            Bystander.id, Bystander.fake_name, Bystander.type,
+            Bystander.alive, Bystander.failed, Bystander.deathtime
+        ).filter(
+            Bystander.network_id == self.id
+        ).order_by(Bystander.creation_time)
+        roster = [
+            Player(node_id, name, node_type, bool(alive), failed,
+                   deathtime and deathtime.strftime(DATETIME_FORMAT))
+            for node_id, name, node_type, alive, failed, deathtime in rows
+        ]
+        return roster
+
+    def invalidate_roster(self):
+        """Note that the current transaction changes the roster. Until it
+        ends, `roster` reads it from the database; once it ends, the cached
+        roster moves on to a new generation.
+        """
+        session = object_session(self) or db.session
+        session.info.setdefault(CHANGED_ROSTERS, set()).add(self.id)
 
     def live_nodes(self):
         """Living bystanders and mafiosi"""
-        nodes = Node.query.filter_by(
-            network_id=self.id, property2='True', failed='False'
-        ).all()
-        return nodes
+        return [p for p in self.roster() if p.alive and not p.failed]
 
     def live_mafiosi(self):
         """Living mafiosi"""
-        mafiosi = Node.query.filter_by(
-            network_id=self.id, property2='True', failed='False', type='mafioso'
-        ).all()
-        return mafiosi
+        return [p for p in self.live_nodes() if p.type == 'mafioso']
+
+    def player(self, fake_name):
+        """The Player in this network going by `fake_name`."""
+        for p in self.roster():
+            if p.fake_name == fake_name:
+                return p
+        raise KeyError(fake_name)
 
     def get_winner(self):
         nodes = self.live_nodes()
-        db.logger.exception('Live Nodes')
-        db.logger.exception(nodes)
         mafiosi = self.live_mafiosi()
-        db.logger.exception('Live Mafiosi')
-        db.logger.exception(mafiosi)
+        gamelog.record(logging.DEBUG, self.id, 'survivors',
+                       players=lambda: [n.fake_name for n in nodes],
+                       mafiosi=lambda: [n.fake_name for n in mafiosi])
         if len(mafiosi) >= len(nodes) - len(mafiosi):
             winner = 'mafia'
             self.winner = winner
@@ -383,3 +558,22 @@ class MafiaNetwork(Network):
             return winner
         else:
             return self.winner
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _roster_changes_ended(session, transaction):
+    """Move the rosters a transaction changed on to a new generation once
+    it commits or rolls back. Bumping after a rollback only costs a cache
+    miss.
+    """
+    if transaction.parent is not None:
+        return
+    changed = session.info.pop(CHANGED_ROSTERS, None)
+    if not changed:
+        return
+    pipe = redis_conn.pipeline()
+    for network_id in changed:
+        key = keys.key(network_id, 'roster', 'generation')
+        pipe.incr(key)
+        pipe.expire(key, ROSTER_GENERATION_TTL)
+    pipe.execute()
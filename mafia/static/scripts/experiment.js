@@ -1,9 +1,11 @@
-/* global $, dallinger */
+/* global $, dallinger, pubsub */
 var currentNodeId;
+var currentNetworkId;
 var currentNodeName;
 var currentNodeType;
 var wasDaytime = 'False';
 var switches = 0;
+var phaseVersion = 0;
 var voted = false;
 var is_break = false;
 
@@ -35,13 +37,15 @@ var create_agent = function() {
   var deferred = dallinger.createAgent();
   deferred.then(function (resp) {
     currentNodeId = resp.node.id;
+    currentNetworkId = resp.node.network_id;
     currentNodeName = resp.node.property1;
     currentNodeType = resp.node.type;
+    startSocket();
     $("#narrator").html("The game will begin shortly...");
     $("#stimulus").show();
     // this is how long the "The game will begin shortly..." message gets displayed (ms)
     setTimeout(function () { $("#stimulus").hide(); showExperiment(); }, 2000);
-    // if you change this number you have to change it in "start_duration" in experiment.py
+    // if you change this number you have to change it in "START_DURATION" in experiment.py
   }, function (err) {
     console.log(err);
     var errorResponse = JSON.parse(err.response);
@@ -54,6 +58,18 @@ var create_agent = function() {
   });
 };
 
+// Listen for the phase clock the server publishes for our game.
+var startSocket = function() {
+  var socket = pubsub.Socket({
+    "endpoint": "chat",
+    "broadcast": "mafia:" + currentNetworkId,
+    "control": "mafia_ctrl"
+  });
+  socket.subscribe(update_phase, "phase_change");
+  socket.subscribe(tick, "tick");
+  return socket;
+};
+
 var getParticipants = function() {
   dallinger.get("/live_participants/" + currentNodeId + '/' + 1).done(
     function (resp) {
@@ -130,134 +146,150 @@ var showExperiment = function() {
 };
 
 var check_phase = function() {
-  var deferred = dallinger.get(
+  dallinger.get(
     "/phase/" + currentNodeId + '/' + switches + '/' + wasDaytime
-  );
-  deferred.then(function (resp) {
-    // end game if there's a winner
-    if (resp.winner) {
-      $("#player").hide();
-      $("#clock").hide();
-      $("#response-form").hide();
-      $("#vote-form").hide();
+  ).done(update_phase);
+};
+
+var tick = function(resp) {
+  if (resp.network_id !== currentNetworkId) {
+    return;
+  }
+  if (wasDaytime != resp.daytime) {
+    // We missed a phase change; ask the server what happened.
+    check_phase();
+    return;
+  }
+  if (resp.daytime == 'True') {
+    $('#remaining').html('Time remaining this day: ' + resp.time);
+  } else {
+    $('#remaining').html('Time remaining this night: ' + resp.time);
+  }
+  if (resp.time > 0 && resp.time <= 10 && voted == false && (resp.daytime == 'True' || (resp.daytime == 'False' && currentNodeType == 'mafioso'))) {
+    if (resp.time == 1) {
+      $("#narrator").html("You have " + resp.time + " second remaining to vote. Please vote now!");
+    } else {
+      $("#narrator").html("You have " + resp.time + " seconds remaining to vote. Please vote now!");
+    }
+    $("#stimulus").show();
+  } else if (!is_break) {
+    $("#stimulus").hide();
+  }
+};
+
+var update_phase = function(resp) {
+  if (resp.network_id !== currentNetworkId) {
+    return;
+  }
+  if (resp.version !== undefined) {
+    phaseVersion = resp.version;
+  }
+  // end game if there's a winner
+  if (resp.winner) {
+    $("#player").hide();
+    $("#clock").hide();
+    $("#response-form").hide();
+    $("#vote-form").hide();
+    if (currentNodeType == 'mafioso') {
+      $("#mafia").hide();
+      $("#note").hide();
+      $("#vote-note").hide();
+    } else {
+      $("#bystanders").hide();
+    }
+    $("#narrator").html(resp.victim_name + ", who is a " + resp.victim_type + ", has been eliminated! The " + resp.winner + " have won!");
+    $("#stimulus").show();
+    setTimeout(function () { leave_chatroom(); }, 8000);
+  // otherwise...
+  } else if (wasDaytime != resp.daytime) {
+    wasDaytime = resp.daytime;
+    switches++;
+    voted = false;
+    is_break = true;
+    $("#reply").append("<hr>");
+    $("#votes").append("<hr>");
+    if (resp.daytime == 'False') { // Nighttime
+      $("#reply").append("<h5>Night " + ((switches / 2) + 1).toString() + "</h5>");
+      $("#votes").append("<h5>Night " + ((switches / 2) + 1).toString() + "</h5>");
+      document.body.style.backgroundColor = "royalblue";
+      if (resp.victim_name) {
+        $("#narrator").html(resp.victim_name + ", who is a " + resp.victim_type + ", has been eliminated!");
+      } else {
+        $("#narrator").html("No one has been eliminated this round!");
+      }
       if (currentNodeType == 'mafioso') {
-        $("#mafia").hide();
-        $("#note").hide();
-        $("#vote-note").hide();
+        $("#note").html('These messages are private!');
+        $("#vote-note").html('These votes are private!');
       } else {
+        $("#note").show();
         $("#bystanders").hide();
       }
-      $("#narrator").html(resp.victim_name + ", who is a " + resp.victim_type + ", has been eliminated! The " + resp.winner + " have won!");
-      $("#stimulus").show();
-      setTimeout(function () { leave_chatroom(); }, 8000);
-    // otherwise...
-    } else {
-      if (resp.daytime == 'True') {
-        $('#remaining').html('Time remaining this day: ' + resp.time);
+
+    } else { // Daytime
+      $("#reply").append("<h5>Day " + ((switches + 1) / 2).toString() + "</h5>");
+      $("#votes").append("<h5>Day " + ((switches + 1) / 2).toString() + "</h5>");
+      document.body.style.backgroundColor = "lightskyblue";
+      if (resp.victim_name) {
+        $("#narrator").html(resp.victim_name + " has been eliminated!");
       } else {
-        $('#remaining').html('Time remaining this night: ' + resp.time);
+        $("#narrator").html("No one has been eliminated this round!");
       }
-
-      if (wasDaytime != resp.daytime) {
-        wasDaytime = resp.daytime;
-        switches++;
-        voted = false;
-        is_break = true;
-        $("#reply").append("<hr>");
-        $("#votes").append("<hr>");
-        if (resp.daytime == 'False') { // Nighttime
-          $("#reply").append("<h5>Night " + ((switches / 2) + 1).toString() + "</h5>");
-          $("#votes").append("<h5>Night " + ((switches / 2) + 1).toString() + "</h5>");
-          document.body.style.backgroundColor = "royalblue";
-          if (resp.victim_name) {
-            $("#narrator").html(resp.victim_name + ", who is a " + resp.victim_type + ", has been eliminated!");
-          } else {
-            $("#narrator").html("No one has been eliminated this round!");
-          }
-          if (currentNodeType == 'mafioso') {
-            $("#note").html('These messages are private!');
-            $("#vote-note").html('These votes are private!');
-          } else {
-            $("#note").show();
-            $("#bystanders").hide();
-          }
-
-        } else { // Daytime
-          $("#reply").append("<h5>Day " + ((switches + 1) / 2).toString() + "</h5>");
-          $("#votes").append("<h5>Day " + ((switches + 1) / 2).toString() + "</h5>");
-          document.body.style.backgroundColor = "lightskyblue";
-          if (resp.victim_name) {
-            $("#narrator").html(resp.victim_name + " has been eliminated!");
-          } else {
-            $("#narrator").html("No one has been eliminated this round!");
-          }
-          if (currentNodeType == 'mafioso') {
-            $("#note").html('These messages are public!');
-            $("#vote-note").html('These votes are public!');
-          } else {
-            $("#note").hide();
-            getModel();
-            $("#bystanders").show();
-          }
-        }
-        // Any time...
-        $("#stimulus").show();
-        if (resp.victim_name == currentNodeName) {
-          // this is how long the "this person has been eliminated!" message gets displayed (ms)
-          setTimeout(function () { leave_chatroom(); }, 10000);
-          // if you change this number below you should change it here for consistency
-        }
-        getParticipants();
-        if (currentNodeType == 'mafioso' && resp.victim_type == 'mafioso') {
-          getMafia();
-        }
-        // this is how long the "this person has been eliminated!" message gets displayed (ms)
-        setTimeout(
-          function () { $("#stimulus").hide(); is_break = false; get_transmissions(currentNodeId); },
-          10000
-        );
-      // if you change this number you have to change it in "break_duration" in experiment.py
-      } else if (resp.time > 0 && resp.time <= 10 && voted == false && (resp.daytime == 'True' || (resp.daytime == 'False' && currentNodeType == 'mafioso'))) {
-        if (resp.time == 1) {
-          $("#narrator").html("You have " + resp.time + " second remaining to vote. Please vote now!");
-        } else {
-          $("#narrator").html("You have " + resp.time + " seconds remaining to vote. Please vote now!");
-        }
-        $("#stimulus").show();
-        setTimeout(function () { get_transmissions(currentNodeId); }, 100);
+      if (currentNodeType == 'mafioso') {
+        $("#note").html('These messages are public!');
+        $("#vote-note").html('These votes are public!');
       } else {
-        setTimeout(function () { $("#stimulus").hide(); get_transmissions(currentNodeId); }, 100);
+        $("#note").hide();
+        getModel();
+        $("#bystanders").show();
       }
     }
-  }, function (err) {
-    setTimeout(function () { get_transmissions(currentNodeId); }, 100);
-  });
+    // Any time...
+    $("#stimulus").show();
+    if (resp.victim_name == currentNodeName) {
+      // this is how long the "this person has been eliminated!" message gets displayed (ms)
+      setTimeout(function () { leave_chatroom(); }, 10000);
+      // if you change this number below you should change it here for consistency
+    }
+    getParticipants();
+    if (currentNodeType == 'mafioso' && resp.victim_type == 'mafioso') {
+      getMafia();
+    }
+    // this is how long the "this person has been eliminated!" message gets displayed (ms)
+    setTimeout(
+      function () { $("#stimulus").hide(); is_break = false; get_transmissions(); },
+      10000
+    );
+    // if you change this number you have to change it in "BREAK_DURATION" in experiment.py
+  }
 };
 
+// Wait for new messages or a phase change, show them, then wait again.
 var get_transmissions = function() {
-  dallinger.getTransmissions(
-    currentNodeId,
-    {status: "pending"}
+  dallinger.get(
+    "/transmissions/" + currentNodeId + '/' + phaseVersion
   ).done(function(resp) {
     var transmissions = resp.transmissions;
-    for (var i = transmissions.length - 1; i >= 0; i--) {
-      displayInfo(transmissions[i].info_id);
+    for (var i = 0; i < transmissions.length; i++) {
+      displayInfo(transmissions[i]);
     }
-    check_phase();
+    if (resp.phase.version !== phaseVersion) {
+      update_phase(resp.phase);
+    }
+    if (!is_break) {
+      get_transmissions();
+    }
+  }).fail(function() {
+    setTimeout(function () { get_transmissions(); }, 1000);
   });
 };
 
-var displayInfo = function(infoId) {
- dallinger.getInfo(currentNodeId, infoId).done(
-   function(resp) {
-     var word = resp.info.contents;
-     if (resp.info.type === 'text') {
-       $("#reply").append("<p>" + word + "</p>");
-     } else if (resp.info.type === 'vote') {
-       $("#votes").append("<p>" + word + "</p>");
-     }
-   }
- );
+var displayInfo = function(transmission) {
+  var word = transmission.contents;
+  if (transmission.type === 'text') {
+    $("#reply").append("<p>" + word + "</p>");
+  } else if (transmission.type === 'vote') {
+    $("#votes").append("<p>" + word + "</p>");
+  }
 };
 
 
@@ -0,0 +1,171 @@
+"""Behavioural features and the model that scores how suspicious players are."""
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+from dallinger.db import redis_conn
+from dallinger.models import timenow
+from joblib import load
+
+from . import keys
+
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+MODEL_PATH = 'mafia_model.joblib'
+# Keep a game's features around for a day after the last update.
+FEATURES_TTL = 24 * 60 * 60
+# Score the live games at most once per interval (seconds), whichever
+# worker gets there first.
+SCORING_INTERVAL = 1
+
+_models = {}
+
+
+def load_model(path=MODEL_PATH):
+    """Return the suspicion model, loading it from disk only when the file
+    has changed since we last read it.
+    """
+    mtime = os.path.getmtime(path)
+    cached = _models.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _models[path] = (mtime, load(path))
+    return cached[1]
+
+
+class FeatureStore(object):
+    """Running totals of each player's daytime behaviour in one network.
+
+    The totals are updated as each Text and Vote comes in, so building the
+    model's features never needs to walk the game's history.
+    """
+
+    def __init__(self, network):
+        self.network = network
+        self.key = keys.key(network.id, 'features')
+
+    def record(self, node, info):
+        """Add a Text or Vote from `node` to its running totals. Only
+        daytime activity counts.
+        """
+        state = self.network.phase_state()
+        if state['daytime'] != 'True':
+            return
+        day = (state['version'] + 1) // 2
+        started_at = datetime.strptime(state['started_at'], DATETIME_FORMAT)
+        seconds = ((info.creation_time or timenow()) - started_at).total_seconds()
+        first_act = redis_conn.sadd(self._acted_key(day), node.id)
+
+        key = self._node_key(node.id)
+        pipe = redis_conn.pipeline()
+        if info.type == 'vote':
+            pipe.hincrby(key, 'votes', 1)
+            pipe.hincrbyfloat(key, 'vote_time', seconds)
+        else:
+            text = info.contents.split(': ', 1)[1]
+            if first_act:
+                pipe.hincrby(key, 'texts_first', 1)
+            if redis_conn.sadd(self._texted_key(day), node.id):
+                pipe.hincrby(key, 'rounds_with_text', 1)
+            pipe.hincrby(key, 'num_texts', 1)
+            pipe.hincrby(key, 'len_texts', len(text))
+            pipe.hincrbyfloat(key, 'text_time', seconds)
+        pipe.expire(key, FEATURES_TTL)
+        pipe.expire(self._acted_key(day), FEATURES_TTL)
+        pipe.expire(self._texted_key(day), FEATURES_TTL)
+        pipe.execute()
+
+    def record_victim(self, victim_name, tally):
+        """Credit everyone whose day vote matched the player eliminated."""
+        if not victim_name:
+            return
+        pipe = redis_conn.pipeline()
+        for node_id, votee in tally.items():
+            if votee == victim_name:
+                pipe.hincrby(self._node_key(node_id), 'majority', 1)
+        pipe.execute()
+
+    def features(self, players):
+        """Return the eight model features for each of `players`, keyed by
+        fake name. Rates are per completed day, so nothing is returned
+        before the second day.
+        """
+        days = (self.network.phase_state()['version'] + 1) // 2 - 1
+        if days < 1:
+            return {}
+        pipe = redis_conn.pipeline()
+        for player in players:
+            pipe.hgetall(self._node_key(player.id))
+        totals = pipe.execute()
+
+        features = {}
+        for player, total in zip(players, totals):
+            total = {k.decode('utf-8'): float(v) for k, v in total.items()}
+            if not total and not player.alive:
+                continue
+            num_texts = total.get('num_texts', 0.)
+            features[player.fake_name] = [
+                total.get('votes', 0.) / days,
+                total.get('majority', 0.) / days,
+                total.get('texts_first', 0.) / days,
+                total.get('rounds_with_text', 0.) / days,
+                total.get('vote_time', 0.) / days,
+                total.get('text_time', 0.) / days,
+                num_texts / days,
+                total.get('len_texts', 0.) / num_texts if num_texts else 0.,
+            ]
+        return features
+
+    def _node_key(self, node_id):
+        return '{}:{}'.format(self.key, node_id)
+
+    def _acted_key(self, day):
+        return '{}:acted:{}'.format(self.key, day)
+
+    def _texted_key(self, day):
+        return '{}:texted:{}'.format(self.key, day)
+
+
+def score(games):
+    """Score every player of every game in one `predict_proba` call.
+
+    `games` is a list of (network, players) pairs. Each network's
+    [[name, mafia probability], ...] list is cached for `latest_scores`.
+    """
+    rows = []
+    owners = []
+    for net, players in games:
+        for name, row in FeatureStore(net).features(players).items():
+            rows.append(row)
+            owners.append((net.id, name))
+
+    scores = dict((net.id, []) for net, _ in games)
+    if rows:
+        probs = load_model().predict_proba(np.asarray(rows, dtype=float))
+        for (net_id, name), mafia_prob in zip(owners, probs[:, 0]):
+            scores[net_id].append([name, float(mafia_prob)])
+
+    pipe = redis_conn.pipeline()
+    for net_id, participants in scores.items():
+        pipe.set(_scores_key(net_id), json.dumps(participants),
+                 ex=FEATURES_TTL)
+    pipe.execute()
+
+
+def scoring_due():
+    """True for only one worker in each scoring interval."""
+    return bool(redis_conn.set(
+        keys.key('scoring'), 1, nx=True, ex=SCORING_INTERVAL))
+
+
+def latest_scores(network):
+    """Return the most recent scores for `network`'s players."""
+    scores = redis_conn.get(_scores_key(network.id))
+    if scores is None:
+        return []
+    return json.loads(scores)
+
+
+def _scores_key(network_id):
+    return keys.key(network_id, 'suspects')
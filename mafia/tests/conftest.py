@@ -0,0 +1,196 @@
+"""
+Test fixtures for the mafia experiment.
+"""
+import uuid
+
+import pytest
+from dallinger import models
+
+
+@pytest.fixture(scope='module', autouse=True)
+def reset_config():
+    yield
+
+    # Make sure dallinger_experiment module isn't kept between tests
+    import sys
+    if 'dallinger_experiment' in sys.modules:
+        del sys.modules['dallinger_experiment']
+
+    # Make sure extra parameters aren't kept between tests
+    from dallinger.config import get_config
+    config = get_config()
+    config._reset(register_defaults=True)
+
+
+@pytest.fixture
+def stub_config():
+    """Builds a standardized Configuration object and returns it, but does
+    not load it as the active configuration returned by
+    dallinger.config.get_config()
+    """
+    defaults = {
+        u'aws_region': u'us-east-1',
+        u'base_port': 5000,
+        u'clock_on': True,
+        u'dallinger_email_address': u'test@example.com',
+        u'database_url': u'postgresql://postgres@localhost/dallinger',
+        u'dyno_type': u'standard-2x',
+        u'heroku_team': u'dallinger',
+        u'host': u'localhost',
+        u'logfile': u'server.log',
+        u'loglevel': 0,
+        u'mode': u'debug',
+        u'num_dynos_web': 2,
+        u'num_dynos_worker': 2,
+        u'threads': u'1',
+        u'whimsical': True
+    }
+    from dallinger.config import default_keys
+    from dallinger.config import Configuration
+    config = Configuration()
+    for key in default_keys:
+        config.register(*key)
+    config.extend(defaults.copy())
+    config.ready = True
+
+    return config
+
+
+@pytest.fixture
+def active_config(stub_config):
+    """Loads the standard config as the active configuration returned by
+    dallinger.config.get_config() and returns it.
+    """
+    from dallinger.config import get_config
+    config = get_config()
+    config.data = stub_config.data
+    config.ready = True
+    return config
+
+
+@pytest.fixture
+def exp_module(active_config):
+    """The experiment module, loaded the way Dallinger loads it."""
+    import dallinger.experiment
+    dallinger.experiment.load()
+    from dallinger_experiment import experiment
+    try:
+        experiment.extra_parameters()
+    except KeyError:
+        pass
+
+    yield experiment
+
+
+@pytest.fixture
+def run_id(active_config):
+    """Gives the test a run id of its own, so it never sees another test's
+    games in redis, and deletes its redis keys afterwards.
+    """
+    from dallinger.db import redis_conn
+    run_id = u'test-{}'.format(uuid.uuid4().hex)
+    active_config.extend({u'id': run_id})
+    yield run_id
+    for key in redis_conn.scan_iter('mafia:{}:*'.format(run_id)):
+        redis_conn.delete(key)
+
+
+@pytest.fixture
+def db_session(run_id):
+    import dallinger.db
+    # The drop_all call can hang without this; see:
+    # https://stackoverflow.com/questions/13882407/sqlalchemy-blocked-on-dropping-tables
+    dallinger.db.session.close()
+    session = dallinger.db.init_db(drop_all=True)
+    yield session
+    session.rollback()
+    session.close()
+
+
+@pytest.fixture
+def exp_klass(db_session, exp_module):
+    import dallinger.experiment
+    klass = dallinger.experiment.load()
+
+    yield klass
+
+
+@pytest.fixture
+def exp(exp_klass, db_session):
+    """An experiment with its games set up."""
+    experiment = exp_klass(db_session)
+    db_session.commit()
+    return experiment
+
+
+@pytest.fixture
+def a(db_session, exp_module):
+    """ Provides a standard way of building model objects in tests.
+
+        def test_using_all_defaults(self, a):
+            player = a.bystander(network=a.mafia_network(), fake_name='Ann')
+    """
+    import models as mafia_models
+
+    class ModelFactory(object):
+
+        def __init__(self, db):
+            self.db = db
+
+        def participant(self, **kw):
+            defaults = {
+                'recruiter_id': 'hotair',
+                'worker_id': '1',
+                'assignment_id': '1',
+                'hit_id': '1',
+                'mode': 'test'
+            }
+            defaults.update(kw)
+            return self._build(models.Participant, defaults)
+
+        def mafia_network(self, **kw):
+            defaults = {}
+            defaults.update(kw)
+            return self._build(mafia_models.MafiaNetwork, defaults)
+
+        def bystander(self, **kw):
+            return self._player(mafia_models.Bystander, kw)
+
+        def mafioso(self, **kw):
+            return self._player(mafia_models.Mafioso, kw)
+
+        def info(self, **kw):
+            defaults = {
+                'contents': u'Hello'
+            }
+            defaults.update(kw)
+            return self._build(models.Info, defaults)
+
+        def _player(self, klass, kw):
+            attrs = {
+                'network': self.mafia_network
+            }
+            attrs.update(kw)
+            fake_name = attrs.pop('fake_name', u'Ann')
+            alive = attrs.pop('alive', True)
+            player = self._build(klass, attrs)
+            player.fake_name = fake_name
+            player.alive = alive
+            self.db.flush()
+            return player
+
+        def _build(self, klass, attrs):
+            # Some of our default values are factories:
+            for k, v in attrs.items():
+                if callable(v):
+                    attrs[k] = v()
+
+            obj = klass(**attrs)
+            self._insert(obj)
+            return obj
+
+        def _insert(self, thing):
+            db_session.add(thing)
+            db_session.flush()  # This gets us an ID and sets relationships
+
+    return ModelFactory(db_session)
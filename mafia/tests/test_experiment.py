@@ -0,0 +1,52 @@
+import pytest
+from dallinger.db import redis_conn
+
+
+class TestSwitchPhase(object):
+
+    @pytest.fixture
+    def game(self, exp, a, db_session):
+        net = exp.networks()[0]
+        for i in range(exp.num_participants):
+            participant = a.participant(
+                worker_id=str(i), assignment_id=str(i), hit_id=str(i))
+            node = exp.create_node(participant, net)
+            exp.add_node_to_network(node, net)
+        db_session.commit()
+        return net
+
+    def test_moves_to_next_phase(self, exp, game, db_session):
+        state = exp.switch_phase(game, 0)
+        db_session.commit()
+
+        assert state['version'] == 1
+        assert state['daytime'] == 'True'
+        assert game.phase_version == 1
+        assert game.phase_state() == state
+
+    def test_second_switch_of_same_version_is_a_no_op(
+            self, exp, game, db_session):
+        exp.switch_phase(game, 0)
+        db_session.commit()
+        announcement_id = game.announcement_id
+        events = game.events()
+
+        assert exp.switch_phase(game, 0) is None
+        db_session.commit()
+
+        assert game.phase_version == 1
+        assert game.daytime
+        assert game.announcement_id == announcement_id
+        assert game.events() == events
+
+    def test_lost_switch_brings_cached_state_up_to_date(
+            self, exp, game, db_session):
+        state = exp.switch_phase(game, 0)
+        db_session.commit()
+        redis_conn.delete(game.phase_key)
+
+        assert exp.switch_phase(game, 0) is None
+        db_session.commit()
+
+        assert redis_conn.get(game.phase_key) is not None
+        assert game.phase_state() == state
@@ -0,0 +1,166 @@
+import json
+
+import pytest
+from dallinger.db import redis_conn
+from dallinger.models import Info, Node, Transformation, Transmission, Vector
+
+
+class TestKillVictim(object):
+
+    def play(self, a, db_session):
+        """A game whose victim has vectors, infos, transmissions and
+        transformations of every kind, next to rows it has no part in.
+        """
+        net = a.mafia_network()
+        victim = a.bystander(network=net, fake_name=u'victim')
+        other = a.bystander(network=net, fake_name=u'other')
+        third = a.bystander(network=net, fake_name=u'third')
+        victim.connect(whom=other, direction='both')
+        other.connect(whom=third)
+        own = a.info(origin=victim, contents=u'own')
+        derived = a.info(origin=victim, contents=u'derived')
+        heard = a.info(origin=other, contents=u'heard')
+        repeated = a.info(origin=other, contents=u'repeated')
+        gossip = a.info(origin=other, contents=u'gossip')
+        victim.transmit(what=own, to_whom=other)
+        other.transmit(what=heard, to_whom=victim)
+        other.transmit(what=gossip, to_whom=third)
+        victim.receive()
+        other.receive()
+        db_session.add_all([
+            # Made by the victim, from its own info and from one it heard.
+            Transformation(info_in=own, info_out=derived),
+            Transformation(info_in=heard, info_out=derived),
+            # Made by someone else, from the victim's info.
+            Transformation(info_in=own, info_out=repeated),
+            # Nothing to do with the victim.
+            Transformation(info_in=heard, info_out=gossip),
+        ])
+        db_session.flush()
+        return net, victim
+
+    def failed_rows(self, db_session, net):
+        """Every failed row of `net`, named by players and contents instead
+        of ids, so that two games can be compared.
+        """
+        names = dict(db_session.query(Node.id, Node.property1).filter(
+            Node.network_id == net.id))
+        contents = dict(db_session.query(Info.id, Info.contents).filter(
+            Info.network_id == net.id))
+        rows = set()
+        for origin_id, destination_id in db_session.query(
+                Vector.origin_id, Vector.destination_id).filter(
+                Vector.network_id == net.id, Vector.failed.is_(True)):
+            rows.add(('vector', names[origin_id], names[destination_id]))
+        for info_id, in db_session.query(Info.id).filter(
+                Info.network_id == net.id, Info.failed.is_(True)):
+            rows.add(('info', contents[info_id]))
+        for info_id, destination_id in db_session.query(
+                Transmission.info_id, Transmission.destination_id).filter(
+                Transmission.network_id == net.id,
+                Transmission.failed.is_(True)):
+            rows.add(
+                ('transmission', contents[info_id], names[destination_id]))
+        for info_in_id, info_out_id in db_session.query(
+                Transformation.info_in_id, Transformation.info_out_id).filter(
+                Transformation.network_id == net.id,
+                Transformation.failed.is_(True)):
+            rows.add(('transformation',
+                      contents[info_in_id], contents[info_out_id]))
+        return rows
+
+    def test_fails_the_rows_fail_did(self, a, db_session):
+        killed, victim = self.play(a, db_session)
+        failed, failed_victim = self.play(a, db_session)
+
+        killed.kill_victim(victim)
+        failed_victim.fail()
+        db_session.flush()
+
+        rows = self.failed_rows(db_session, killed)
+        assert rows == self.failed_rows(db_session, failed)
+        assert set(row[0] for row in rows) == set(
+            ['vector', 'info', 'transmission', 'transformation'])
+        assert ('vector', u'other', u'third') not in rows
+        assert ('transmission', u'gossip', u'third') not in rows
+        assert ('transformation', u'heard', u'gossip') not in rows
+
+    def test_leaves_the_victim_node_alone(self, a, db_session):
+        net, victim = self.play(a, db_session)
+
+        net.kill_victim(victim)
+        db_session.flush()
+
+        assert not victim.failed
+        assert not victim.alive
+        assert victim.deathtime is not None
+        assert net.num_victims == 1
+
+
+class TestRoster(object):
+
+    @pytest.fixture
+    def network(self, a, db_session):
+        net = a.mafia_network()
+        a.bystander(network=net, fake_name=u'Ann')
+        a.mafioso(network=net, fake_name=u'Bob')
+        db_session.commit()
+        return net
+
+    def generation(self, net):
+        return int(redis_conn.get(net.roster_generation_key) or 0)
+
+    def cached(self, exp_module, net, generation):
+        key = exp_module.keys.key(net.id, 'roster', generation)
+        cached = redis_conn.get(key)
+        return cached and json.loads(cached)
+
+    def victim(self, net):
+        return Node.query.get(net.player(u'Ann').id)
+
+    def test_committed_kill_moves_to_new_generation(self, network, db_session):
+        assert network.player(u'Ann').alive
+        generation = self.generation(network)
+
+        network.kill_victim(self.victim(network))
+        db_session.commit()
+
+        assert self.generation(network) == generation + 1
+        assert not network.player(u'Ann').alive
+
+    def test_uncommitted_kill_is_never_cached(
+            self, exp_module, network, db_session):
+        network.roster()
+        generation = self.generation(network)
+
+        network.kill_victim(self.victim(network))
+
+        assert not network.player(u'Ann').alive
+        assert self.generation(network) == generation
+        assert [p[3] for p in self.cached(exp_module, network, generation)] \
+            == [True, True]
+        assert self.cached(exp_module, network, generation + 1) is None
+
+        db_session.rollback()
+
+        assert self.generation(network) == generation + 1
+        assert network.player(u'Ann').alive
+
+    def test_join_moves_to_new_generation_once_committed(
+            self, exp_module, exp, a, db_session):
+        network = exp.networks()[0]
+        assert network.roster() == []
+        generation = self.generation(network)
+
+        node = exp.create_node(a.participant(), network)
+        exp.add_node_to_network(node, network)
+
+        assert [p.id for p in network.roster()] == [node.id]
+        assert self.cached(exp_module, network, generation) == []
+        assert self.cached(exp_module, network, generation + 1) is None
+
+        db_session.commit()
+
+        assert self.generation(network) == generation + 1
+        assert [p.id for p in network.roster()] == [node.id]
+        assert self.cached(exp_module, network, generation + 1) is not None
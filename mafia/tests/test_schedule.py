@@ -0,0 +1,49 @@
+import pytest
+
+
+class TestPhaseSchedule(object):
+
+    @pytest.fixture
+    def experiment(self, exp_module):
+        return exp_module
+
+    def test_matches_round_arithmetic(self, experiment):
+        schedule = experiment.phase_schedule(0)
+
+        # Opening night, then break + day, break + night, ...
+        assert schedule[:5] == [12, 82, 102, 172, 192]
+        assert len(schedule) == experiment.SCHEDULED_ROUNDS
+
+    def test_clock_counts_switches(self, experiment):
+        schedule = experiment.phase_schedule(0)
+        clock = experiment.phase_clock
+
+        assert clock(schedule, 5) == (0, 7)
+        assert clock(schedule, 12) == (1, 60)
+        assert clock(schedule, 50) == (1, 32)
+        # The break before the night counts as night.
+        assert clock(schedule, 85) == (2, 10)
+        assert clock(schedule, 100) == (2, 2)
+
+    def test_clock_extends_schedule(self, experiment):
+        schedule = experiment.phase_schedule(0)
+        last = schedule[-1]
+
+        switches, left = experiment.phase_clock(schedule, last + 1)
+
+        assert switches == experiment.SCHEDULED_ROUNDS
+        assert len(schedule) > experiment.SCHEDULED_ROUNDS
+        assert schedule[switches] == last + (
+            experiment.BREAK_DURATION +
+            experiment.round_duration(switches))
+        assert left == min(experiment.round_duration(switches),
+                           schedule[switches] - last - 1)
+
+    def test_clock_far_past_schedule(self, experiment):
+        schedule = experiment.phase_schedule(0)
+        now = schedule[-1] * 5
+
+        switches, _ = experiment.phase_clock(schedule, now)
+
+        assert schedule[switches - 1] <= now < schedule[switches]
+        assert schedule == experiment.phase_schedule(0, len(schedule))
@@ -14,6 +14,7 @@ from dallinger.nodes import Source
 from dallinger.experiment import Experiment
 from . import bonuses
 from . import games
+from . import metrics
 from . import topologies
 from . import transmission
 from . import models
@@ -27,6 +28,7 @@ extra_routes = flask.Blueprint(
     __name__,
     template_folder='templates',
     static_folder='static')
+metrics.instrument(extra_routes)
 
 
 @extra_routes.route("/experiment")
@@ -270,7 +272,7 @@ class CoordinationChatroom(Experiment):
         )
         logger.info("Partners: {}".format(self.q.partner_indexes(node)))
         logger.info("Current vectors: {}".format(
-            self.q.unique_agent_index_vectors())
+            self.q.unique_agent_index_vectors(node.network_id))
         )
 
     def info_post_request(self, node, info):
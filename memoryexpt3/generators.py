@@ -0,0 +1,163 @@
+"""Random graphs for topologies described by `mexp_topology` strings.
+
+A spec is a generator name followed by its parameters, for example
+`ws:n=200,k=4,p=0.1,seed=7`:
+
+- `ring:n,k`: ring lattice, each vertex joined to its k nearest neighbors
+- `ws:n,k,p,seed`: Watts-Strogatz, the ring lattice with each edge rewired
+  with probability p
+- `er:n,p,seed`: Erdos-Renyi, each possible edge present with probability p
+- `ba:n,m,seed`: Barabasi-Albert scale-free graph, each new vertex attached
+  to m existing ones in proportion to their degree
+
+Every worker has to build the same graph, so the seed defaults to 0. Graphs
+are saved as .npz edge arrays in CACHE_DIR and loaded from there after.
+"""
+
+import inspect
+import os
+import re
+
+import numpy as np
+
+
+CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'topology_cache')
+PARAMETER_TYPES = {'n': int, 'k': int, 'm': int, 'p': float, 'seed': int}
+# Generated topologies are stored by spec in network.type.
+MAX_SPEC_LENGTH = 50
+
+
+def ring(n, k=2, seed=0):
+    """Ring lattice with each vertex joined to its k nearest neighbors."""
+    if k % 2 or not 0 < k < n:
+        raise ValueError('k must be even and between 0 and n')
+    vertices = np.arange(n)
+    return _normalize(np.concatenate([
+        np.column_stack([vertices, (vertices + j) % n])
+        for j in range(1, k // 2 + 1)
+    ]))
+
+
+def watts_strogatz(n, k=4, p=0.1, seed=0):
+    """Ring lattice whose edges are each rewired to a uniformly chosen new
+    endpoint with probability p, avoiding self loops and duplicate edges.
+    """
+    rng = np.random.default_rng(seed)
+    neighbors = [set() for _ in range(n)]
+    for u, v in ring(n, k):
+        neighbors[u].add(v)
+        neighbors[v].add(u)
+    for j in range(1, k // 2 + 1):
+        for u in range(n):
+            v = (u + j) % n
+            if rng.random() >= p or len(neighbors[u]) >= n - 1:
+                continue
+            w = rng.integers(n)
+            while w == u or w in neighbors[u]:
+                w = rng.integers(n)
+            neighbors[u].remove(v)
+            neighbors[v].remove(u)
+            neighbors[u].add(w)
+            neighbors[w].add(u)
+    return _normalize([(u, v) for u in range(n) for v in neighbors[u]])
+
+
+def erdos_renyi(n, p=0.1, seed=0):
+    """Each of the n * (n - 1) / 2 possible edges present with
+    probability p.
+    """
+    rng = np.random.default_rng(seed)
+    u, v = np.triu_indices(n, 1)
+    keep = rng.random(len(u)) < p
+    return _normalize(np.column_stack([u[keep], v[keep]]))
+
+
+def barabasi_albert(n, m=2, seed=0):
+    """Preferential attachment: each vertex after the first m is joined to
+    m distinct earlier ones, chosen in proportion to their degree.
+    """
+    if not 0 < m < n:
+        raise ValueError('m must be between 0 and n')
+    rng = np.random.default_rng(seed)
+    edges = []
+    # Every vertex appears here once per edge it has.
+    ends = []
+    targets = list(range(m))
+    for source in range(m, n):
+        edges.extend((source, t) for t in targets)
+        ends.extend(targets)
+        ends.extend([source] * m)
+        chosen = set()
+        while len(chosen) < m:
+            chosen.add(ends[rng.integers(len(ends))])
+        targets = sorted(chosen)
+    return _normalize(edges)
+
+
+GENERATORS = {
+    'ring': ring,
+    'ws': watts_strogatz,
+    'er': erdos_renyi,
+    'ba': barabasi_albert,
+}
+
+
+def parse(spec):
+    """Split a spec into its generator name and typed parameters."""
+    name, _, parameters = spec.partition(':')
+    name = name.strip()
+    if name not in GENERATORS:
+        raise ValueError('Unknown topology generator: {}'.format(name))
+    accepted = inspect.signature(GENERATORS[name]).parameters
+    params = {'seed': 0}
+    for parameter in filter(None, parameters.split(',')):
+        key, _, value = parameter.partition('=')
+        key = key.strip()
+        if key not in PARAMETER_TYPES or key not in accepted:
+            raise ValueError('Unknown {} parameter: {}'.format(name, key))
+        params[key] = PARAMETER_TYPES[key](value.strip())
+    if 'n' not in params:
+        raise ValueError('Topology spec {} has no n'.format(spec))
+    return name, params
+
+
+def canonical(spec):
+    """Return the spec with its parameters, including the default seed,
+    written out in a fixed order.
+    """
+    name, params = parse(spec)
+    canonical = '{}:{}'.format(name, ','.join(
+        '{}={}'.format(key, params[key]) for key in sorted(params)))
+    if len(canonical) > MAX_SPEC_LENGTH:
+        raise ValueError('Topology spec {} is too long'.format(canonical))
+    return canonical
+
+
+def edges(spec, cache_dir=None):
+    """Return the (E, 2) array of `spec`'s edges, each as (low, high) and
+    sorted, generating the graph only if it isn't in `cache_dir` (by default
+    CACHE_DIR) yet.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    spec = canonical(spec)
+    path = os.path.join(cache_dir, re.sub(r'[^\w.=-]', '_', spec) + '.npz')
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            return cached['edges']
+
+    name, params = parse(spec)
+    result = GENERATORS[name](**params)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # Write to a temporary file first so other workers never load half a
+    # file.
+    temporary = '{}.{}.npz'.format(path[:-len('.npz')], os.getpid())
+    np.savez_compressed(temporary, edges=result)
+    os.rename(temporary, path)
+    return result
+
+
+def _normalize(edges):
+    edges = np.sort(np.asarray(edges, dtype=np.int64).reshape(-1, 2), axis=1)
+    return np.unique(edges, axis=0)
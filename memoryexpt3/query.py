@@ -1,54 +1,124 @@
+import numpy as np
+from dallinger import db
 from dallinger import nodes
 from dallinger import models
+from sqlalchemy import and_
+from sqlalchemy.orm import aliased
+
+
+class NodeIndex(object):
+    """The agents of one network in creation order, and each agent's offset
+    in that order, keyed by node id.
+    """
+
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.offsets = dict((node_id, i) for i, node_id in enumerate(self.ids))
+
+
+class Adjacency(object):
+    """A snapshot of the agents and the vectors between them.
+
+    `ids` holds the agents' node ids in creation order, so an agent's index
+    is its position there. `edges` is an (E, 2) array of (origin,
+    destination) index pairs, sorted.
+    """
+
+    def __init__(self, ids, edges):
+        self.ids = ids
+        self.edges = edges
+
+    def __len__(self):
+        return len(self.ids)
+
+    def csr(self):
+        """Return the outgoing neighbors as a CSR (indptr, indices) pair:
+        agent i's neighbors are indices[indptr[i]:indptr[i + 1]].
+        """
+        counts = np.bincount(self.edges[:, 0], minlength=len(self))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return indptr, self.edges[:, 1]
+
+    def unique_edges(self):
+        """Return the undirected edges as sorted (low, high) index pairs."""
+        if not len(self.edges):
+            return self.edges
+        return np.unique(np.sort(self.edges, axis=1), axis=0)
 
 
 class Query(object):
 
     def index_of(self, node):
-        """Return the index/creation order offset of the given Node.
+        """Return the index/creation order offset of the given Node within
+        its network: the number of agents created before it that haven't
+        failed, counted with one query.
         """
-        agents = nodes.Agent.query.all()
-        node_index = agents.index(node)
-        return node_index
+        return nodes.Agent.query.filter(
+            nodes.Agent.network_id == node.network_id,
+            nodes.Agent.id < node.id,
+            nodes.Agent.failed.is_(False),
+        ).count()
 
     def partner_indexes(self, node):
         """Return a list of Agent indexes (based on creation order)
         for the neighbors of the provided Agent/Node.
         """
-        agents = nodes.Agent.query.all()
-        node_index = agents.index(node)
-        neighbors = agents[node_index].neighbors()
-        return [agents.index(n) for n in neighbors]
-
-    def agent_index_vectors(self):
-        agents = self._agents()
-        vectors = self._vectors()
-
-        result = [
-            (agents.index(v.origin), agents.index(v.destination))
-            for v in vectors
+        offsets = self.node_index(node.network_id).offsets
+        return [offsets[n.id] for n in node.neighbors()]
+
+    def node_index(self, network_id):
+        """Return the NodeIndex of a network, read with one id-only query.
+
+        It isn't cached: other workers add and fail agents too, so only the
+        database knows the current order.
+        """
+        return NodeIndex(self._agent_ids(network_id))
+
+    def agent_index_vectors(self, network_id):
+        return [
+            tuple(edge) for edge in self.adjacency(network_id).edges.tolist()
         ]
 
-        return sorted(result)
+    def unique_agent_index_vectors(self, network_id):
+        return [
+            tuple(edge)
+            for edge in self.adjacency(network_id).unique_edges().tolist()
+        ]
 
-    def unique_agent_index_vectors(self):
-        agents = self._agents()
-        vectors = self._vectors()
-        unique_pairs = set()
-        for v in vectors:
-            ordered = tuple(
-                sorted([agents.index(v.origin), agents.index(v.destination)])
+    def adjacency(self, network_id):
+        """Snapshot the agents of a network and the vectors between them
+        with a single query. Indexes count within the network, like
+        `index_of`'s.
+        """
+        origin = aliased(nodes.Agent)
+        destination = aliased(nodes.Agent)
+        rows = db.session.query(origin.id, destination.id).outerjoin(
+            models.Vector, and_(
+                models.Vector.origin_id == origin.id,
+                models.Vector.failed.is_(False),
             )
-            unique_pairs.add(ordered)
-
-        return sorted(list(unique_pairs))
+        ).outerjoin(
+            destination, and_(
+                destination.id == models.Vector.destination_id,
+                destination.failed.is_(False),
+            )
+        ).filter(
+            origin.network_id == network_id,
+            origin.failed.is_(False),
+        ).all()
 
-    def _agents(self):
-        return nodes.Agent.query.all()
+        ids = np.unique(np.array([o for o, _ in rows], dtype=np.int64))
+        pairs = np.array([(o, d) for o, d in rows if d is not None],
+                         dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[np.isin(pairs[:, 1], ids)]
+        edges = np.searchsorted(ids, pairs)
+        edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+        return Adjacency(ids, edges)
 
-    def _vectors(self):
-        vectors = [
-            v for v in models.Vector.query.all()
-            if v.origin.participant_id is not None
-        ]
-        return vectors
+    def _agent_ids(self, network_id):
+        return [node_id for node_id, in nodes.Agent.query.with_entities(
+            nodes.Agent.id
+        ).filter(
+            nodes.Agent.network_id == network_id,
+            nodes.Agent.failed.is_(False),
+        ).order_by(nodes.Agent.id)]
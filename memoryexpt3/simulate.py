@@ -0,0 +1,161 @@
+"""Offline Monte Carlo estimates of how a word spreads over a topology.
+
+Each trial starts with one random participant knowing the word. At every
+step everyone who knows it passes it on the way the transmitter would:
+to all of their neighbors (`promiscuous`) or to one neighbor chosen at
+random (`random`). All the trials for a topology run together as NumPy
+arrays, split into chunks across a process pool, and the report gives the
+coverage reached and the number of steps until everyone knows the word.
+
+Sweep every SmallWorld variant with both transmitters:
+
+    python -m memoryexpt3.simulate --trials 10000
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from dallinger.networks import Empty
+from dallinger.networks import FullyConnected
+
+from . import topologies
+from . import transmission
+
+
+def neighbor_lists(topology, size=None):
+    """Return the CSR (indptr, partners) neighbor lists of a BaseTopology
+    subclass. Nominal and collaborative topologies have no edge list, so
+    for those the group `size` is needed.
+    """
+    if topology.all_edges is not NotImplemented:
+        return topology._indptr, topology._partners
+    if size is None:
+        raise ValueError('{} needs a group size'.format(topology.__name__))
+    if issubclass(topology, FullyConnected):
+        edges = [(i, j) for i in range(size) for j in range(i + 1, size)]
+        return topologies.neighbor_lists(edges)
+    if issubclass(topology, Empty):
+        return np.zeros(size + 1, dtype=np.int64), np.zeros(0, np.int64)
+    raise ValueError('{} has no edges'.format(topology.__name__))
+
+
+def spread(indptr, partners, nickname, trials, steps, seed):
+    """Run `trials` spreads of `steps` steps each, and return each trial's
+    coverage (the fraction of participants who know the word) after every
+    step, as a (trials, steps + 1) array.
+    """
+    rng = np.random.default_rng(seed)
+    size = len(indptr) - 1
+    degree = np.diff(indptr)
+    informed = np.zeros((trials, size), dtype=bool)
+    informed[np.arange(trials), rng.integers(size, size=trials)] = True
+    coverage = np.empty((trials, steps + 1))
+    coverage[:, 0] = informed.mean(axis=1)
+
+    everyone = isinstance(transmission.by_name(nickname),
+                          transmission.AllNeighbors)
+    if everyone:
+        adjacency = np.zeros((size, size), dtype=np.float32)
+        adjacency[np.repeat(np.arange(size), degree), partners] = 1
+    for step in range(1, steps + 1):
+        if everyone:
+            informed |= np.dot(informed.astype(np.float32), adjacency) > 0
+        elif len(partners):
+            picks = indptr[:-1] + (rng.random((trials, size)) *
+                                   degree).astype(np.int64)
+            targets = partners[np.minimum(picks, len(partners) - 1)]
+            trial, sender = np.nonzero(informed & (degree > 0))
+            informed[trial, targets[trial, sender]] = True
+        coverage[:, step] = informed.mean(axis=1)
+    return coverage
+
+
+def simulate(topology, nickname, trials=1000, steps=50, size=None, seed=0,
+             pool=None, chunks=1):
+    """Spread a word over `topology` with the transmitter called
+    `nickname` in `trials` trials, in `chunks` pieces on `pool` if given,
+    and return the (trials, steps + 1) coverage array.
+    """
+    if transmission.by_name(nickname) is None:
+        raise ValueError('Unknown transmitter: {}'.format(nickname))
+    indptr, partners = neighbor_lists(topology, size)
+    seeds = np.random.SeedSequence(seed).spawn(chunks)
+    sizes = [len(c) for c in np.array_split(np.arange(trials), chunks)]
+    args = [(indptr, partners, nickname, n, steps, s)
+            for n, s in zip(sizes, seeds) if n]
+    if pool is None:
+        results = [spread(*a) for a in args]
+    else:
+        results = [f.result() for f in [pool.submit(spread, *a) for a in args]]
+    return np.concatenate(results)
+
+
+def summarize(coverage):
+    """Coverage and time-to-saturation statistics of a coverage array."""
+    final = coverage[:, -1]
+    saturated = coverage >= 1
+    reached = saturated.any(axis=1)
+    times = np.argmax(saturated, axis=1)[reached]
+    summary = {
+        'coverage_mean': final.mean(),
+        'coverage_p5': np.percentile(final, 5),
+        'coverage_p50': np.percentile(final, 50),
+        'saturated': reached.mean(),
+        'steps_p50': None,
+        'steps_p95': None,
+    }
+    if len(times):
+        summary['steps_p50'] = np.percentile(times, 50)
+        summary['steps_p95'] = np.percentile(times, 95)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('topologies', nargs='*',
+                        help='topology names (default: every SmallWorld)')
+    parser.add_argument('--transmitters', nargs='+',
+                        default=[u'promiscuous', u'random'])
+    parser.add_argument('--trials', type=int, default=1000)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--size', type=int,
+                        help='group size for nominal and collaborative')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = args.topologies or smallworld_names()
+    print('{:<28}{:<13}{:>9}{:>9}{:>9}{:>11}{:>10}{:>10}'.format(
+        'topology', 'transmitter', 'covered', 'p5', 'p50', 'saturated',
+        'steps p50', 'steps p95'))
+    workers = args.workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as pool:
+        for name in names:
+            topology = topologies.by_name(name)
+            for nickname in args.transmitters:
+                summary = summarize(simulate(
+                    topology, nickname, args.trials, args.steps, args.size,
+                    args.seed, pool, workers))
+                print('{:<28}{:<13}{:>9.3f}{:>9.3f}{:>9.3f}{:>11.3f}'
+                      '{:>10}{:>10}'.format(
+                          name, nickname, summary['coverage_mean'],
+                          summary['coverage_p5'], summary['coverage_p50'],
+                          summary['saturated'],
+                          _steps(summary['steps_p50']),
+                          _steps(summary['steps_p95'])))
+
+
+def smallworld_names():
+    """The names of every SmallWorld topology, sorted."""
+    return sorted(name for name in topologies.BY_NAME
+                  if name and name.startswith('smallworld'))
+
+
+def _steps(steps):
+    return '-' if steps is None else '{:.0f}'.format(steps)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+
+class TestGenerators(object):
+
+    @pytest.fixture
+    def generators(self, exp_module):
+        return exp_module.topologies.generators
+
+    def test_ring_joins_nearest_neighbors(self, generators):
+        assert generators.ring(6, 2).tolist() == [
+            [0, 1], [0, 5], [1, 2], [2, 3], [3, 4], [4, 5]]
+
+    def test_watts_strogatz_without_rewiring_is_a_ring(self, generators):
+        ring = generators.ring(20, 4)
+        small_world = generators.watts_strogatz(20, 4, p=0., seed=7)
+
+        assert small_world.tolist() == ring.tolist()
+
+    def test_watts_strogatz_keeps_edge_count(self, generators):
+        edges = generators.watts_strogatz(200, 4, p=.1, seed=7)
+
+        assert len(edges) == 400
+        assert (edges[:, 0] < edges[:, 1]).all()
+
+    def test_same_seed_same_graph(self, generators):
+        first = generators.erdos_renyi(50, .1, seed=3)
+        second = generators.erdos_renyi(50, .1, seed=3)
+
+        assert first.tolist() == second.tolist()
+
+    def test_barabasi_albert_edge_count(self, generators):
+        assert len(generators.barabasi_albert(100, 2, seed=1)) == 2 * 98
+
+    def test_canonical_spec(self, generators):
+        assert generators.canonical(' ws: n=200, p=0.1,k=4') == (
+            'ws:k=4,n=200,p=0.1,seed=0')
+
+    @pytest.mark.parametrize('spec', [
+        'xx:n=3', 'ws:k=4', 'ws:n=3,q=1', 'er:n=10,k=4', 'ring:n=10,p=0.1'])
+    def test_bad_specs(self, generators, spec):
+        with pytest.raises(ValueError):
+            generators.canonical(spec)
+
+    def test_edges_are_cached(self, generators, tmpdir):
+        cache_dir = str(tmpdir)
+        edges = generators.edges('ws:n=30,k=4,p=0.2,seed=1', cache_dir)
+
+        assert os.listdir(cache_dir) == ['ws_k=4_n=30_p=0.2_seed=1.npz']
+        cached = generators.edges('ws:seed=1,n=30,k=4,p=0.2', cache_dir)
+        assert cached.tolist() == edges.tolist()
+
+
+class TestGeneratedTopology(object):
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(self, exp_module, tmpdir, monkeypatch):
+        monkeypatch.setattr(exp_module.topologies.generators, 'CACHE_DIR',
+                            str(tmpdir))
+
+    def test_by_name_builds_topology_from_spec(self, exp_module):
+        topology = exp_module.topologies.by_name(u'ring:n=10,k=2')
+
+        assert topology.nickname == u'ring:k=2,n=10,seed=0'
+        assert topology().potential_partners(0) == [1, 9]
+
+    def test_same_spec_same_class(self, exp_module):
+        by_name = exp_module.topologies.by_name
+
+        assert by_name(u'ring:n=12,k=4') is by_name(u'ring:k=4,n=12')
@@ -0,0 +1,52 @@
+import pytest
+
+
+class TestSummarize(object):
+
+    @pytest.fixture
+    def metrics(self, exp_module):
+        return exp_module.metrics
+
+    def test_averages_per_request(self, metrics):
+        summary = metrics.summarize({
+            'GET /experiment|count': 4.,
+            'GET /experiment|bucket:2': 4.,
+            'GET /experiment|wall_time': .02,
+            'GET /experiment|sql_count': 12.,
+            'GET /experiment|sql_time': .008,
+        })
+
+        stats = summary['GET /experiment']
+        assert stats['count'] == 4
+        assert stats['mean_ms'] == pytest.approx(5.)
+        assert stats['sql_count'] == 3.
+        assert stats['sql_ms'] == pytest.approx(2.)
+
+    def test_percentiles_are_bucket_upper_bounds(self, metrics):
+        totals = {'GET /experiment|count': 100.}
+        totals['GET /experiment|bucket:0'] = 50.
+        totals['GET /experiment|bucket:3'] = 45.
+        totals['GET /experiment|bucket:5'] = 4.
+        totals['GET /experiment|bucket:{}'.format(len(metrics.BUCKETS))] = 1.
+
+        stats = metrics.summarize(totals)['GET /experiment']
+        assert stats['p50_ms'] == metrics.BUCKETS[0]
+        assert stats['p95_ms'] == metrics.BUCKETS[3]
+        assert stats['p99_ms'] == metrics.BUCKETS[5]
+
+    def test_slowest_bucket_has_no_upper_bound(self, metrics):
+        summary = metrics.summarize({
+            'GET /experiment|count': 1.,
+            'GET /experiment|bucket:{}'.format(len(metrics.BUCKETS)): 1.,
+        })
+
+        assert summary['GET /experiment']['p50_ms'] is None
+
+    def test_routes_are_kept_apart(self, metrics):
+        summary = metrics.summarize({
+            'GET /experiment|count': 1.,
+            'GET /instructions_0|count': 2.,
+        })
+
+        assert summary['GET /experiment']['count'] == 1
+        assert summary['GET /instructions_0']['count'] == 2
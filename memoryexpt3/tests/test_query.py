@@ -0,0 +1,124 @@
+import pytest
+
+
+@pytest.mark.usefixtures('exp_module')
+class TestNodeIndex(object):
+
+    @pytest.fixture
+    def network(self, a):
+        return a.network()
+
+    @pytest.fixture
+    def other_network(self, a):
+        return a.network()
+
+    @pytest.fixture
+    def join(self, a):
+        def join(network):
+            return a.node(network=network, participant=a.participant())
+        return join
+
+    def test_index_is_creation_order_within_network(
+            self, network, other_network, join, dbview):
+        first = join(network)
+        join(other_network)
+        second = join(network)
+
+        assert dbview.index_of(first) == 0
+        assert dbview.index_of(second) == 1
+
+    def test_node_index_sees_every_join(self, network, join, dbview):
+        nodes = [join(network) for _ in range(3)]
+        assert dbview.node_index(network.id).offsets[nodes[0].id] == 0
+
+        late = join(network)
+
+        index = dbview.node_index(network.id)
+        assert index.ids == [n.id for n in nodes + [late]]
+        assert index.offsets[late.id] == dbview.index_of(late) == 3
+
+    def test_failed_node_is_dropped_from_index(self, network, join, dbview,
+                                               db_session):
+        nodes = [join(network) for _ in range(3)]
+        assert dbview.index_of(nodes[2]) == 2
+
+        nodes[0].fail()
+        db_session.flush()
+
+        assert dbview.index_of(nodes[2]) == 1
+
+    def test_failures_from_other_workers_count(self, network, join, dbview,
+                                               db_session):
+        from dallinger.models import Node
+        nodes = [join(network) for _ in range(3)]
+        assert dbview.index_of(nodes[2]) == 2
+
+        # An UPDATE, like another worker's, with no attribute events here.
+        Node.query.filter_by(id=nodes[0].id).update({'failed': True})
+
+        assert dbview.index_of(nodes[2]) == 1
+        assert dbview.node_index(network.id).ids == [
+            nodes[1].id, nodes[2].id]
+
+    def test_partner_indexes(self, network, join, dbview):
+        nodes = [join(network) for _ in range(3)]
+        nodes[0].connect(whom=[nodes[1], nodes[2]])
+
+        assert dbview.partner_indexes(nodes[0]) == [1, 2]
+        assert dbview.partner_indexes(nodes[1]) == []
+
+
+@pytest.mark.usefixtures('exp_module')
+class TestAdjacency(object):
+
+    @pytest.fixture
+    def network(self, a):
+        return a.network()
+
+    @pytest.fixture
+    def agents(self, a, network):
+        agents = [a.node(network=network, participant=a.participant())
+                  for _ in range(4)]
+        agents[0].connect(whom=[agents[1], agents[2]], direction='both')
+        agents[2].connect(whom=agents[3])
+        return agents
+
+    @pytest.fixture
+    def earlier_agent(self, a):
+        """An agent of another network, created before the others."""
+        return a.node(network=a.network(), participant=a.participant())
+
+    def test_ids_in_creation_order(self, network, agents, dbview):
+        snapshot = dbview.adjacency(network.id)
+
+        assert snapshot.ids.tolist() == [n.id for n in agents]
+
+    def test_edges_in_index_space(self, network, agents, dbview):
+        snapshot = dbview.adjacency(network.id)
+
+        assert snapshot.edges.tolist() == [
+            [0, 1], [0, 2], [1, 0], [2, 0], [2, 3]]
+        assert snapshot.unique_edges().tolist() == [[0, 1], [0, 2], [2, 3]]
+
+    def test_csr(self, network, agents, dbview):
+        indptr, indices = dbview.adjacency(network.id).csr()
+
+        assert indptr.tolist() == [0, 2, 3, 5, 5]
+        assert indices[indptr[2]:indptr[3]].tolist() == [0, 3]
+
+    def test_failed_vectors_are_left_out(self, network, agents, dbview,
+                                         db_session):
+        for vector in agents[2].vectors(direction='outgoing'):
+            if vector.destination_id == agents[3].id:
+                vector.fail()
+        db_session.flush()
+
+        assert dbview.adjacency(network.id).edges.tolist() == [
+            [0, 1], [0, 2], [1, 0], [2, 0]]
+
+    def test_agent_index_vectors(self, earlier_agent, agents, network,
+                                 dbview):
+        assert dbview.agent_index_vectors(network.id) == [
+            (0, 1), (0, 2), (1, 0), (2, 0), (2, 3)]
+        assert dbview.unique_agent_index_vectors(network.id) == [
+            (0, 1), (0, 2), (2, 3)]
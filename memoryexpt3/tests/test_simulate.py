@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+
+class TestSimulate(object):
+
+    @pytest.fixture
+    def simulate(self, exp_module):
+        from dallinger_experiment import simulate
+        return simulate
+
+    @pytest.fixture
+    def topologies(self, exp_module):
+        return exp_module.topologies
+
+    def test_promiscuous_saturates_baby4(self, simulate, topologies):
+        coverage = simulate.simulate(
+            topologies.Baby4, u'promiscuous', trials=100, steps=3)
+
+        assert coverage.shape == (100, 4)
+        assert (coverage[:, 0] == .25).all()
+        assert (coverage[:, 2] == 1).all()
+
+    def test_random_reaches_one_neighbor_per_step(self, simulate,
+                                                  topologies):
+        coverage = simulate.simulate(
+            topologies.Baby2, u'random', trials=100, steps=1)
+
+        # Whoever starts tells exactly one other participant.
+        assert np.allclose(coverage[:, 1], 2. / 3)
+
+    def test_nominal_never_spreads(self, simulate, topologies):
+        coverage = simulate.simulate(
+            topologies.Nominal, u'random', trials=10, steps=5, size=4)
+
+        assert (coverage == .25).all()
+
+    def test_chunks_on_pool_match_trial_count(self, simulate, topologies):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(2) as pool:
+            coverage = simulate.simulate(
+                topologies.KarateClub, u'random', trials=101, steps=5,
+                pool=pool, chunks=4)
+
+        assert coverage.shape == (101, 6)
+
+    def test_same_seed_same_result(self, simulate, topologies):
+        first = simulate.simulate(topologies.SmallWorldA, u'random', seed=3)
+        second = simulate.simulate(topologies.SmallWorldA, u'random', seed=3)
+
+        assert (first == second).all()
+
+    def test_unknown_transmitter(self, simulate, topologies):
+        with pytest.raises(ValueError):
+            simulate.simulate(topologies.Baby4, u'gossip')
+
+    def test_summarize(self, simulate):
+        coverage = np.array([[.5, 1., 1.], [.5, .5, 1.], [.5, .5, .5]])
+        summary = simulate.summarize(coverage)
+
+        assert summary['saturated'] == pytest.approx(2. / 3)
+        assert summary['steps_p50'] == 1.5
+        assert summary['coverage_p50'] == 1.
+
+    def test_default_run_sweeps_every_small_world(self, simulate, monkeypatch,
+                                                  capsys):
+        from concurrent.futures import ThreadPoolExecutor
+        monkeypatch.setattr(simulate, 'ProcessPoolExecutor',
+                            ThreadPoolExecutor)
+        monkeypatch.setattr('sys.argv', [
+            'simulate', '--trials', '4', '--steps', '2', '--workers', '2'])
+
+        simulate.main()
+
+        names = simulate.smallworld_names()
+        assert names[0] == u'smallworlda' and len(names) == 16
+        rows = capsys.readouterr().out.splitlines()[1:]
+        assert [row.split()[:2] for row in rows] == [
+            [name, nickname]
+            for name in names for nickname in (u'promiscuous', u'random')]
@@ -29,6 +29,14 @@ class TestBaseTopology(object):
         assert topology.potential_partners(2) == [0, 3]
         assert topology.potential_partners(3) == [0, 2]
 
+    def test_potential_partners_of_unknown_index_is_empty(self, topology):
+        assert topology.potential_partners(4) == []
+
+    def test_neighbor_lists_are_built_with_the_class(self, topology):
+        assert topology.edges() is topology.edges()
+        assert topology._indptr.tolist() == [0, 3, 4, 6, 8]
+        assert topology._partners.tolist() == [1, 2, 3, 0, 0, 3, 0, 2]
+
 
 @pytest.mark.usefixtures('exp_module')
 class TestTopology(object):
@@ -96,6 +104,24 @@ class TestTopology(object):
             [{4, 6}, {3}, {3}]
         )
 
+    def test_slots_count_joins_made_elsewhere(self, a, exp_module):
+        topology = exp_module.topologies.Baby4(max_size=4)
+
+        def join(add=True):
+            node = a.node(network=topology, participant=a.participant())
+            if add:
+                topology.add_node(node)
+            return node
+
+        first = join()
+        # Another worker's join, which this process never sees.
+        join(add=False)
+        third = join()
+        fourth = join()
+
+        assert set(third.neighbors()) == {first, fourth}
+        assert set(fourth.neighbors()) == {first, third}
+
 
 @pytest.mark.usefixtures('exp_module')
 class TestKarateClub(object):
@@ -153,4 +179,4 @@ class TestKarateClub(object):
         for idx, node in enumerate(nodes):
             assert dbview.partner_indexes(node) == net.potential_partners(idx)
 
-        dbview.unique_agent_index_vectors() == net.edges()
+        dbview.unique_agent_index_vectors(net.id) == net.edges()
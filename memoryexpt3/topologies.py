@@ -1,53 +1,76 @@
 import logging
+import numpy as np
+import re
 from sqlalchemy.orm.session import Session
 
 from dallinger.networks import Empty
 from dallinger.networks import FullyConnected
 from dallinger.networks import Network
 from dallinger.nodes import Agent
+from . import generators
+from . import query
 
 logger = logging.getLogger(__name__)
 
 
+def neighbor_lists(edges):
+    """Build CSR neighbor lists from undirected `edges`: the partners of
+    vertex i, sorted, are partners[indptr[i]:indptr[i + 1]].
+    """
+    edges = np.array(edges, dtype=np.int64).reshape(-1, 2)
+    ends = np.concatenate([edges, edges[:, ::-1]])
+    ends = ends[np.lexsort((ends[:, 1], ends[:, 0]))]
+    num_vertices = edges.max() + 1 if len(edges) else 0
+    counts = np.bincount(ends[:, 0], minlength=num_vertices)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    return indptr, ends[:, 1]
+
+
 class BaseTopology(object):
-    """Abstract base class."""
+    """Abstract base class.
+
+    Subclasses with `all_edges` get their sorted edges and neighbor lists
+    built once, when the class is created.
+    """
 
     nickname = None
     all_edges = NotImplemented
     __mapper_args__ = {"polymorphic_identity": nickname}
 
+    def __init_subclass__(cls, **kwargs):
+        super(BaseTopology, cls).__init_subclass__(**kwargs)
+        if cls.all_edges is not NotImplemented:
+            cls._sorted_edges = sorted(cls.all_edges)
+            cls._indptr, cls._partners = neighbor_lists(cls._sorted_edges)
+
     def edges(self):
-        return sorted(self.all_edges)
+        return self._sorted_edges
 
     def potential_partners(self, index):
-        partners = []
-        for edge in self.edges():
-            if index in edge:
-                other_user = [vertex for vertex in edge if vertex != index][0]
-                partners.append(other_user)
-
-        return sorted(partners)
+        if index + 1 >= len(self._indptr):
+            return []
+        return self._partners[
+            self._indptr[index]:self._indptr[index + 1]].tolist()
 
     def add_node(self, node):
         """Add a node, connecting it to everyone and back."""
         # Newly created nodes might not be flushed to the database yet
         # which would cause indexing errors.
         Session.object_session(node).flush()
-        # The nodes are keyed on id, as the id is managed by the database
-        # and is guaranteed not to collide
-        nodes = sorted(self.nodes(type=Agent), key=lambda x:x.id)
-
-        # Get the index that this node represents, and the edges that are required
-        my_index = nodes.index(node)
-        relevant_edges = [edge for edge in self.edges() if my_index in edge]
-        for edge in relevant_edges:
-            other_user = [vertex for vertex in edge if vertex != my_index][0]
-            try:
-                node.connect(direction="both", whom=nodes[other_user])
-            except IndexError:
-                # The other node has not yet connected, it will connect to us
-                # when it does
-                continue
+        # The nodes are indexed in order of id, as the id is managed by the
+        # database and is guaranteed not to collide. Other workers add
+        # nodes too, so the order is read fresh for every join.
+        index = query.Query().node_index(self.id)
+
+        # Partners that haven't joined yet will connect to us when they do.
+        partner_ids = [
+            index.ids[partner]
+            for partner in self.potential_partners(index.offsets[node.id])
+            if partner < len(index.ids)
+        ]
+        if partner_ids:
+            partners = Agent.query.filter(Agent.id.in_(partner_ids)).all()
+            node.connect(direction="both", whom=partners)
 
 
 class Topology(BaseTopology, Network):
@@ -198,11 +221,35 @@ for cls in _descendent_classes(BaseTopology):
 def by_name(name):
     """Attempt to return a Topology subclass by name.
 
-    Actual class names and known nicknames are both supported.
+    Actual class names and known nicknames are both supported, as are
+    generator specs like `ws:n=200,k=4,p=0.1,seed=7` (see generators.py).
     """
     klass = BY_NAME.get(name)
     if klass is not None:
         return klass
+    if ':' in name:
+        return generated(name)
+
+
+def generated(spec):
+    """Return the Topology subclass for a generated graph, creating it the
+    first time the spec is asked for.
+    """
+    nickname = generators.canonical(spec)
+    klass = BY_NAME.get(nickname)
+    if klass is None:
+        klass = type(Topology)(
+            str('Generated_' + re.sub(r'\W', '_', nickname)),
+            (Topology,),
+            {
+                'nickname': nickname,
+                '__mapper_args__': {"polymorphic_identity": nickname},
+                'all_edges': [
+                    tuple(edge) for edge in generators.edges(spec).tolist()
+                ],
+            })
+        BY_NAME[nickname] = klass
+    return klass
 
 # old:
 